@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+销售仪表板数据链路基准测试（无需浏览器）
+用合成销售表测量：加载（Arrow缓存命中路径）、筛选（df.query vs 位图索引）、
+聚合（groupby vs 立方体）、图表构建耗时，以及每个规模的峰值内存，结果输出为JSON
+
+用法：
+    python bench_sales.py                                  # 默认 1万 / 100万 / 1000万 行
+    python bench_sales.py --rows 10000 1000000 --output bench.json
+    python bench_sales.py --baseline bench.json            # 与上次结果比较，变慢超过阈值时返回非0
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from process_stats import peak_rss_mb
+
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+CITIES = ["太原", "大同", "临汾"]
+CUSTOMER_TYPES = ["会员", "普通"]
+GENDERS = ["男性", "女性"]
+PRODUCT_TYPES = ["健康美容", "电子配件", "家居生活", "运动旅行", "食品饮料", "时尚配饰"]
+# 侧边栏典型筛选：每列只取部分值（全选时位图索引会直接跳过，测不出差异）
+SELECTIONS = {"城市": CITIES[:2], "顾客类型": CUSTOMER_TYPES[:1], "性别": GENDERS}
+
+
+def make_sales_frame(n_rows, seed=42):
+    """生成与销售Excel同结构的合成数据（已是压缩后的列类型）"""
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(10, 21, n_rows, dtype=np.uint8)
+    minutes = rng.integers(0, 60, n_rows)
+    time_codes = (hours.astype(np.int64) - 10) * 60 + minutes
+    time_labels = [f"{h:02d}:{m:02d}:00" for h in range(10, 21) for m in range(60)]
+    unit_price = np.round(rng.uniform(10, 100, n_rows), 2)
+    quantity = rng.integers(1, 11, n_rows, dtype=np.uint8)
+    total = np.round(unit_price * quantity * 1.05, 2)
+
+    def categorical(values):
+        return pd.Categorical.from_codes(rng.integers(0, len(values), n_rows), values)
+
+    df = pd.DataFrame({
+        "城市": categorical(CITIES),
+        "顾客类型": categorical(CUSTOMER_TYPES),
+        "性别": categorical(GENDERS),
+        "产品类型": categorical(PRODUCT_TYPES),
+        "单价": unit_price.astype(np.float32),
+        "数量": quantity,
+        "总价": total,
+        "日期": pd.Timestamp("2019-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D"),
+        "时间": pd.Categorical.from_codes(time_codes, time_labels),
+        "评分": np.round(rng.uniform(4, 10, n_rows), 1).astype(np.float32),
+        "小时数": hours,
+    }, index=pd.RangeIndex(n_rows, name="订单号"))  # 千万行时不生成字符串订单号，避免合成数据本身占满内存
+    return df
+
+
+def timed(func, repeat=1):
+    """返回（最后一次结果, 最短耗时秒数）"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run_single(n_rows, repeat=3):
+    """在当前进程内测一个规模；由父进程为每个规模单独起子进程，保证峰值内存互不影响"""
+    from sales_cache import load_sales_frame, write_cache
+    from sales_cube import build_sales_cube, slice_cube, sales_by_hour, sales_by_product_line, cube_kpis
+    from sales_filter import SalesFilterIndex
+
+    result = {"rows": n_rows, "timings_s": {}}
+    timings = result["timings_s"]
+
+    df, timings["generate"] = timed(lambda: make_sales_frame(n_rows))
+    result["frame_mb"] = round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2)
+
+    # 加载：源文件只作为缓存指纹，测的是仪表板实际走的Arrow缓存命中路径
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_path = os.path.join(tmp_dir, "synthetic_sales.xlsx")
+        with open(source_path, "wb") as f:
+            f.write(b"synthetic")
+        _, timings["cache_write"] = timed(lambda: write_cache(source_path, df))
+        loaded, timings["load"] = timed(lambda: load_sales_frame(source_path), repeat)
+        assert len(loaded) == n_rows
+        del loaded
+
+    # 筛选：原df.query表达式 vs 位图索引
+    city, customer_type, gender = SELECTIONS["城市"], SELECTIONS["顾客类型"], SELECTIONS["性别"]
+    query_result, timings["filter_query"] = timed(
+        lambda: df.query("城市 == @city & 顾客类型 ==@customer_type & 性别 == @gender",
+                         local_dict={"city": city, "customer_type": customer_type, "gender": gender}), repeat)
+    filter_index, timings["filter_index_build"] = timed(lambda: SalesFilterIndex(df))
+    index_result, timings["filter_index"] = timed(lambda: filter_index.select(df, SELECTIONS), repeat)
+    assert len(query_result) == len(index_result)
+
+    # 聚合：筛选后明细groupby vs 立方体单元格汇总
+    def groupby_path():
+        return (
+            query_result.groupby("小时数", observed=True)["总价"].sum(),
+            query_result.groupby("产品类型", observed=True)["总价"].sum().sort_values(),
+            query_result["总价"].sum(), query_result["评分"].mean(), query_result["总价"].mean(),
+        )
+
+    def cube_path():
+        cube_slice = slice_cube(cube, SELECTIONS)
+        return sales_by_hour(cube_slice), sales_by_product_line(cube_slice), cube_kpis(cube_slice)
+
+    _, timings["aggregate_groupby"] = timed(groupby_path, repeat)
+    cube, timings["cube_build"] = timed(lambda: build_sales_cube(df))
+    _, timings["aggregate_cube"] = timed(cube_path, repeat)
+    result["cube_cells"] = len(cube)
+
+    # 图表构建：依赖streamlit/plotly，缺失时只记录原因
+    try:
+        import zzx9
+        cube_slice = slice_cube(cube, SELECTIONS)
+        _, timings["hour_chart"] = timed(lambda: zzx9.hour_chart(query_result, cube_slice), repeat)
+        _, timings["product_line_chart"] = timed(lambda: zzx9.product_line_chart(query_result, cube_slice), repeat)
+    except ImportError as e:
+        result["chart_skipped"] = str(e)
+
+    for key, value in timings.items():
+        timings[key] = round(value, 6)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_all(rows_list, repeat):
+    """每个规模在独立子进程里运行，汇总为一份报告"""
+    report = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": [],
+    }
+    for n_rows in rows_list:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single", str(n_rows), "--repeat", str(repeat)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if proc.returncode != 0:
+            report["results"].append({"rows": n_rows, "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        report["results"].append(json.loads(proc.stdout))
+    return report
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """找出比基线慢超过tolerance（比例）的阶段；极短的阶段（<1ms）不参与比较"""
+    regressions = []
+    baseline_by_rows = {r["rows"]: r for r in baseline.get("results", []) if "timings_s" in r}
+    for current in report["results"]:
+        old = baseline_by_rows.get(current["rows"])
+        if old is None or "timings_s" not in current:
+            continue
+        for stage, seconds in current["timings_s"].items():
+            old_seconds = old["timings_s"].get(stage)
+            if old_seconds is None or old_seconds < 1e-3:
+                continue
+            if seconds > old_seconds * (1 + tolerance):
+                regressions.append(f"{current['rows']}行 {stage}: {old_seconds:.4f}s -> {seconds:.4f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="销售仪表板数据链路基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="合成数据行数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数（取最短）")
+    parser.add_argument("--output", help="JSON结果输出文件（默认打印到标准输出）")
+    parser.add_argument("--baseline", help="基线JSON文件，变慢超过阈值时返回码为1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变慢比例（默认20%%）")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_single(args.single, args.repeat)))
+        return 0
+
+    report = run_all(args.rows, args.repeat)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("性能回退：", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+随机森林紧凑工件格式（代替pickle）
+一个工件是一个目录：扁平化森林的每个数组存成未压缩的 .npy（放在按导出时间命名的版本子目录里），
+目录下的 manifest.json 指向当前版本，并记录格式版本、特征名、分类特征取值、类别标签、来源文件签名和各数组的类型/形状。
+加载时用 np.load(mmap_mode="r") 内存映射，不反序列化任何Python对象，加载时间与模型大小无关，
+同一台机器上的多个Streamlit进程共享同一份页缓存
+
+用法：
+    forest, manifest = load_forest_artifact("rfr_model.forest")
+    python forest_artifact.py rfr_model.pkl rfr_model.forest      # 把已有的pickle/joblib模型导出为工件
+"""
+
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from forest_flat import FlatForest, compile_forest
+from model_registry import file_signature
+
+FORMAT_NAME = "flat-forest"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+ARRAY_NAMES = ["feature", "threshold", "left", "right", "value", "roots", "is_leaf", "missing_left"]
+
+
+def manifest_path(path):
+    return os.path.join(path, MANIFEST_FILE)
+
+
+def _json_signature(signature):
+    """文件签名转成JSON可比较的形式（元组在JSON里会变成列表）"""
+    return json.loads(json.dumps(signature))
+
+
+LOCK_FILE = ".export.lock"
+LOCK_TIMEOUT_SECONDS = 600  # 持锁进程异常退出留下的锁文件，超过这个时间视为失效
+
+
+@contextmanager
+def _export_lock(path, poll=0.05):
+    """工件目录的导出锁（锁文件，跨进程、跨平台）：同一时间只有一个进程在写新版本和清理旧版本"""
+    os.makedirs(path, exist_ok=True)
+    lock_path = os.path.join(path, LOCK_FILE)
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue  # 锁刚被释放
+            time.sleep(poll)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def save_forest_artifact(path, forest, feature_names=None, categories=None, labels=None, source_files=(),
+                         compression=None, encoder=None):
+    """把FlatForest（或已训练的sklearn随机森林）写成工件目录。
+    categories: {分类特征: [取值, ...]}；labels: 类别编号对应的名称；source_files: 导出来源（用于判断工件是否过期）；
+    compression: 剪枝/量化参数（forest_compress导出时记录）；encoder: 特征编码器的to_dict()，随模型一起保存。
+    数组先写进新的版本子目录，最后原子替换manifest.json切换版本：读者不会看到写了一半的工件，
+    也不需要重命名正被其它会话内存映射着的目录（Windows下无法重命名或删除已映射的文件）。
+    多个进程同时导出时按导出锁依次进行"""
+    with _export_lock(path):
+        return _write_artifact(path, forest, feature_names, categories, labels, source_files, compression, encoder)
+
+
+def _write_artifact(path, forest, feature_names=None, categories=None, labels=None, source_files=(),
+                    compression=None, encoder=None):
+    """save_forest_artifact的实现，调用方须持有导出锁"""
+    if not isinstance(forest, FlatForest):
+        forest = compile_forest(forest)
+    if feature_names is not None:
+        forest.feature_names = list(feature_names)
+
+    try:
+        previous = read_manifest(path)
+    except ValueError:
+        previous = None
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    os.makedirs(os.path.join(path, version))
+    arrays = {}
+    for name in ARRAY_NAMES:
+        array = getattr(forest, name)
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        file = f"{version}/{name}.npy"
+        np.save(os.path.join(path, file), array, allow_pickle=False)
+        arrays[name] = {"file": file, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "kind": "classifier" if forest.is_classifier else "regressor",
+        "n_trees": forest.n_trees,
+        "n_nodes": int(len(forest.feature)),
+        "max_depth": forest.max_depth,
+        "n_features": None if forest.n_features is None else int(forest.n_features),
+        "feature_names": forest.feature_names,
+        "classes": None if forest.classes is None else forest.classes.tolist(),
+        "categories": categories or {},
+        "labels": None if labels is None else list(labels),
+        "value_scale": forest.value_scale,
+        "value_offset": forest.value_offset,
+        "compression": compression,
+        "encoder": encoder,
+        "source": _json_signature(file_signature(source_files)),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "arrays": arrays,
+    }
+    tmp_manifest = f"{manifest_path(path)}.tmp-{os.getpid()}"
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    _replace_file(tmp_manifest, manifest_path(path))
+
+    # 上一个版本保留到下次导出：刚读到旧manifest的读者仍能映射到文件
+    _remove_stale_versions(path, previous)
+    return manifest
+
+
+def _replace_file(src, dst, attempts=50, delay=0.02):
+    """原子替换文件；Windows下目标文件正被其它进程读取时os.replace会被拒绝，稍等重试"""
+    for attempt in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay)
+
+
+def _version_time(name):
+    """版本子目录名 v<导出时间ns>-<pid> 中的导出时间；不是版本目录时返回None"""
+    stamp = name[1:].split("-", 1)[0] if name.startswith("v") else ""
+    return int(stamp) if stamp.isdigit() else None
+
+
+def _remove_stale_versions(path, previous):
+    """只删除比上一个manifest的版本更早的版本子目录；上一个版本是旧布局（数组直接放在工件目录下）时，
+    不删除任何东西，旧布局的 .npy 留到下一次导出再删。仍被内存映射而删不掉的文件（Windows）也留到以后再删"""
+    if previous is None:
+        return
+    previous_time = _version_time(previous.get("version", ""))
+    if previous_time is None:
+        return
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if os.path.isdir(full):
+            stamp = _version_time(name)
+            if stamp is not None and stamp < previous_time:
+                shutil.rmtree(full, ignore_errors=True)
+        elif name.endswith(".npy"):
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+
+def read_manifest(path):
+    """读取并校验manifest；不存在时返回None"""
+    try:
+        with open(manifest_path(path), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("format") != FORMAT_NAME or manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的工件格式：{manifest.get('format')} v{manifest.get('format_version')}")
+    return manifest
+
+
+def _load_arrays(path, mmap):
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"未找到模型工件：{manifest_path(path)}")
+    arrays = {}
+    for name, info in manifest["arrays"].items():
+        array = np.load(os.path.join(path, info["file"]), mmap_mode="r" if mmap else None, allow_pickle=False)
+        if array.dtype.str != info["dtype"] or list(array.shape) != info["shape"]:
+            raise ValueError(f"工件数组{name}与manifest不一致，文件可能已损坏")
+        arrays[name] = array
+    return manifest, arrays
+
+
+def load_forest_artifact(path, mmap=True, retries=3):
+    """加载工件，返回（FlatForest, manifest）；mmap=True时所有数组都是只读内存映射。
+    读到manifest后其它进程又连续导出、旧版本已被清理时，重新读取manifest再加载"""
+    for attempt in range(retries + 1):
+        try:
+            manifest, arrays = _load_arrays(path, mmap)
+            break
+        except FileNotFoundError:
+            if attempt == retries or not os.path.exists(manifest_path(path)):
+                raise
+    forest = FlatForest(
+        feature=arrays["feature"],
+        threshold=arrays["threshold"],
+        left=arrays["left"],
+        right=arrays["right"],
+        value=arrays["value"],
+        roots=arrays["roots"],
+        max_depth=manifest["max_depth"],
+        missing_left=arrays.get("missing_left"),
+        classes=None if manifest["classes"] is None else np.asarray(manifest["classes"]),
+        feature_names=manifest["feature_names"],
+        n_features=manifest["n_features"],
+        is_leaf=arrays.get("is_leaf"),
+        value_scale=manifest.get("value_scale"),
+        value_offset=manifest.get("value_offset"),
+    )
+    return forest, manifest
+
+
+def is_artifact_fresh(path, source_files):
+    """工件存在且是从当前的来源文件导出的；来源文件全部不存在时（只部署了工件）也视为可用"""
+    try:
+        manifest = read_manifest(path)
+    except ValueError:
+        return False
+    if manifest is None:
+        return False
+    if not any(os.path.exists(p) for p in source_files):
+        return True
+    return manifest["source"] == _json_signature(file_signature(source_files))
+
+
+def load_or_export(path, source_files, load_model):
+    """优先内存映射工件；工件缺失或比来源文件旧时调用load_model()导出后再加载。
+    load_model返回（sklearn模型或FlatForest, 写入manifest的附加字段dict）"""
+    if not is_artifact_fresh(path, source_files):
+        with _export_lock(path):
+            if not is_artifact_fresh(path, source_files):  # 等锁期间其它进程可能已经导出
+                model, metadata = load_model()
+                _write_artifact(path, model, source_files=source_files, **metadata)
+    return load_forest_artifact(path)
+
+
+def _main():
+    import sys
+
+    import joblib
+
+    from forest_flat import max_abs_diff
+
+    if len(sys.argv) < 3:
+        print("用法：python forest_artifact.py <模型pickle文件> <工件目录>")
+        return 1
+    model = joblib.load(sys.argv[1])   # joblib.load同样能读普通pickle
+    feature_names = None
+    if isinstance(model, tuple):  # zzx10保存的是(模型, 特征名)
+        model, feature_names = model
+    manifest = save_forest_artifact(sys.argv[2], model, feature_names=feature_names, source_files=[sys.argv[1]])
+
+    start = time.perf_counter()
+    forest, _ = load_forest_artifact(sys.argv[2])
+    load_ms = (time.perf_counter() - start) * 1000
+    X = np.random.default_rng(0).normal(size=(1000, model.n_features_in_)).astype(np.float32)
+    print(f"树数：{manifest['n_trees']}，节点数：{manifest['n_nodes']}，工件大小：{forest.nbytes / 1024:.1f} KB")
+    print(f"加载耗时：{load_ms:.2f} ms，与原模型最大差值：{max_abs_diff(model, forest, X)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+随机森林压缩（内存受限的Streamlit工作进程用）
+在扁平化森林（FlatForest）上做：
+- 剪枝：按深度截断，或按每棵树的叶子数上限截断（内部节点本身就保存了样本均值/类别分布，可直接当叶子）
+- 量化：阈值存float16（超出float16范围时保留float32），叶子值存float16或int16（int16用缩放+偏移还原），
+  特征编号存最小的整数类型
+- 减树：只保留前n棵树，或用完整森林的预测作为标签训练一个更小的森林（蒸馏）
+并输出报告：每个变体相对完整模型的精度损失、内存和单行延迟
+
+用法：
+    python forest_compress.py insurance                    # 医疗费用模型（train_model.py / zzx10.py）
+    python forest_compress.py penguin --output report.csv  # 企鹅分类模型（zzx11.py）
+    python forest_compress.py grade --export depth8+int16  # 学生成绩模型（zzx12.py），把该变体写成前端工件
+"""
+
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from forest_flat import FlatForest, compile_forest
+
+LATENCY_ROWS = 200
+
+
+# ====================== 剪枝 ======================
+def node_depths(flat):
+    """每个节点的深度（根为0）"""
+    depth = np.full(len(flat.left), -1, dtype=np.int32)
+    frontier = np.asarray(flat.roots)
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        internal = frontier[~flat.is_leaf[frontier]]
+        frontier = np.concatenate([flat.left[internal], flat.right[internal]])
+        level += 1
+    return depth
+
+
+def tree_ids(flat):
+    """每个节点属于第几棵树（各树节点连续存放，roots升序）"""
+    return np.searchsorted(np.asarray(flat.roots), np.arange(len(flat.left)), side="right") - 1
+
+
+def _rebuild(flat, keep, leaf, **changes):
+    """只保留keep中的节点并重新编号；leaf中的节点变成叶子（子节点指向自己）"""
+    old = np.flatnonzero(keep)
+    new_index = np.cumsum(keep, dtype=np.int64) - 1
+    own = np.arange(len(old), dtype=np.int32)
+    is_leaf = leaf[old]
+    fields = dict(
+        feature=np.where(is_leaf, 0, flat.feature[old]).astype(flat.feature.dtype),
+        threshold=np.asarray(flat.threshold[old]),
+        left=np.where(is_leaf, own, new_index[flat.left[old]]).astype(np.int32),
+        right=np.where(is_leaf, own, new_index[flat.right[old]]).astype(np.int32),
+        value=np.asarray(flat.value[old]),
+        roots=new_index[np.asarray(flat.roots)].astype(np.int32),
+        max_depth=flat.max_depth,
+        missing_left=None if flat.missing_left is None else np.asarray(flat.missing_left[old]),
+        classes=flat.classes,
+        feature_names=flat.feature_names,
+        n_features=flat.n_features,
+        is_leaf=is_leaf,
+        value_scale=flat.value_scale,
+        value_offset=flat.value_offset,
+    )
+    fields.update(changes)
+    return FlatForest(**fields)
+
+
+def prune(flat, max_depth=None, max_leaves=None):
+    """按深度截断（max_depth），或每棵树取叶子数不超过max_leaves的最大深度截断"""
+    depth = node_depths(flat)
+    reachable = depth >= 0
+    cut = np.full(flat.n_trees, flat.max_depth, dtype=np.int32)
+    if max_depth is not None:
+        cut = np.minimum(cut, max_depth)
+    if max_leaves is not None:
+        tree = tree_ids(flat)
+        for d in range(flat.max_depth, -1, -1):
+            # 截断到深度d后的叶子：深度恰为d的节点 + 深度小于d的原叶子
+            leaves = (depth == d) | (flat.is_leaf & (depth < d) & reachable)
+            counts = np.bincount(tree[leaves], minlength=flat.n_trees)
+            too_many = counts > max_leaves
+            cut = np.where(too_many, np.minimum(cut, d - 1), cut)
+        cut = np.maximum(cut, 0)
+    node_cut = cut[tree_ids(flat)]
+    keep = reachable & (depth <= node_cut)
+    leaf = flat.is_leaf | (depth >= node_cut)
+    return _rebuild(flat, keep, leaf, max_depth=int(cut.max()))
+
+
+# ====================== 量化 ======================
+def _smallest_int(max_value):
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def quantize(flat, threshold_dtype=np.float16, value_dtype=np.float16):
+    """阈值、叶子值降精度。value_dtype为整数类型时按 [最小值, 最大值] 线性映射到整个整数范围"""
+    threshold = np.asarray(flat.threshold)
+    internal = ~np.asarray(flat.is_leaf)
+    if internal.any() and np.abs(threshold[internal]).max() > np.finfo(threshold_dtype).max:
+        threshold_dtype = np.float32
+    threshold = threshold.astype(threshold_dtype)
+
+    value = np.asarray(flat.value, dtype=np.float64)
+    if flat.value_scale is not None:
+        value = value * flat.value_scale + flat.value_offset
+    scale = offset = None
+    if np.issubdtype(value_dtype, np.integer):
+        info = np.iinfo(value_dtype)
+        lo, hi = float(value.min()), float(value.max())
+        scale = (hi - lo) / (int(info.max) - int(info.min)) or 1.0
+        offset = lo - int(info.min) * scale
+        value = np.clip(np.round((value - offset) / scale), info.min, info.max).astype(value_dtype)
+    else:
+        value = value.astype(value_dtype)
+
+    feature = np.asarray(flat.feature)
+    feature = feature.astype(_smallest_int(int(feature.max()) if feature.size else 0))
+    return _rebuild(flat, np.ones(len(flat.left), dtype=bool), np.asarray(flat.is_leaf),
+                    feature=feature, threshold=threshold, value=value,
+                    value_scale=None if scale is None else float(scale),
+                    value_offset=None if offset is None else float(offset))
+
+
+# ====================== 减树 ======================
+def select_trees(flat, n_trees):
+    """只保留前n_trees棵树（随机森林的树相互独立，前n棵就是一个n棵树的森林）"""
+    if n_trees >= flat.n_trees:
+        return flat
+    end = int(flat.roots[n_trees])
+    keep = np.zeros(len(flat.left), dtype=bool)
+    keep[:end] = True
+    return _rebuild(flat, keep, np.asarray(flat.is_leaf), roots=np.asarray(flat.roots[:n_trees], dtype=np.int32))
+
+
+def distill(teacher, X, n_trees, max_depth=None, random_state=42):
+    """蒸馏：用完整森林在X上的预测作为标签，训练一个n_trees棵树的小森林"""
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    if teacher.is_classifier:
+        student = RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, random_state=random_state, n_jobs=-1)
+    else:
+        student = RandomForestRegressor(n_estimators=n_trees, max_depth=max_depth, random_state=random_state, n_jobs=-1)
+    student.fit(X, teacher.predict(X))
+    flat = compile_forest(student)
+    flat.feature_names = teacher.feature_names
+    return flat
+
+
+# ====================== 报告 ======================
+VARIANTS = {
+    "full": lambda flat, X: flat,
+    "depth12": lambda flat, X: prune(flat, max_depth=12),
+    "depth8": lambda flat, X: prune(flat, max_depth=8),
+    "leaves64": lambda flat, X: prune(flat, max_leaves=64),
+    "float16": lambda flat, X: quantize(flat),
+    "int16": lambda flat, X: quantize(flat, value_dtype=np.int16),
+    "depth8+int16": lambda flat, X: quantize(prune(flat, max_depth=8), value_dtype=np.int16),
+    "trees20": lambda flat, X: select_trees(flat, 20),
+    "distill20": lambda flat, X: distill(flat, X, 20),
+    "distill20+depth8+int16": lambda flat, X: quantize(prune(distill(flat, X, 20), max_depth=8), value_dtype=np.int16),
+}
+
+
+def single_row_latency_ms(flat, X):
+    timings = []
+    for i in range(min(LATENCY_ROWS, len(X))):
+        start = time.perf_counter()
+        flat.predict(X[i:i + 1])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def compression_report(flat, X, y, variants=None):
+    """逐个变体计算：节点数、内存、单行延迟、精度（回归MAE / 分类准确率）及相对完整模型的变化"""
+    X = np.asarray(X, dtype=np.float32)
+    rows = []
+    baseline = None
+    for name in variants or VARIANTS:
+        variant = VARIANTS[name](flat, X)
+        pred = variant.predict(X)
+        if flat.is_classifier:
+            score = float(np.mean(pred == y))
+            fidelity = float(np.mean(pred == flat.predict(X)))
+        else:
+            score = float(np.mean(np.abs(pred - y)))
+            fidelity = float(np.max(np.abs(pred - flat.predict(X))))
+        row = {
+            "variant": name,
+            "trees": variant.n_trees,
+            "nodes": int(len(variant.feature)),
+            "kb": variant.nbytes / 1024,
+            "latency_ms": single_row_latency_ms(variant, X),
+            "accuracy" if flat.is_classifier else "mae": score,
+            "agreement" if flat.is_classifier else "max_diff": fidelity,
+        }
+        if baseline is None:
+            baseline = row
+        row["memory_saved"] = 1 - row["kb"] / baseline["kb"]
+        row["latency_saved"] = 1 - row["latency_ms"] / baseline["latency_ms"]
+        if flat.is_classifier:
+            row["accuracy_loss"] = baseline["accuracy"] - score
+        else:
+            row["mae_increase"] = score / baseline["mae"] - 1 if baseline["mae"] else 0.0
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ====================== 各应用的模型与数据 ======================
+def _load_insurance():
+    """rfr_model.pkl（模型, 特征名）+ 医疗费用数据，用模型自己的编码器编码"""
+    from insurance_batch import read_insured_file
+    from insurance_encoder import TARGET, InsuranceEncoder, normalize_columns
+
+    with open("rfr_model.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open("feature_names.pkl", "rb") as f:
+        feature_names = pickle.load(f)
+    if isinstance(model, tuple):
+        model = model[0]
+    encoder = InsuranceEncoder.from_feature_names(feature_names)
+    path = "insurance.csv" if os.path.exists("insurance.csv") else "（医疗费用预测数据）insurance-chinese.csv"
+    df = normalize_columns(read_insured_file(path))
+    X, invalid = encoder.transform(df)
+    y = pd.to_numeric(df[TARGET], errors="coerce").to_numpy()
+    valid = ~invalid & ~np.isnan(y)
+    return model, X[valid], y[valid], {"feature_names": feature_names, "categories": encoder.categories,
+                                       "encoder": encoder.to_dict()}
+
+
+def _load_penguin():
+    """rfc_model.pkl + output_uniques.pkl + 企鹅数据（与zzx11共用penguin_data的清洗和编码）"""
+    from penguin_data import load_penguin_dataset
+
+    with open("rfc_model.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open("output_uniques.pkl", "rb") as f:
+        species_map = pickle.load(f)
+    dataset = load_penguin_dataset("(企鹅识别数据)penguins-chinese.csv")
+    X = dataset.X.reindex(columns=list(model.feature_names_in_), fill_value=0)
+    codes = {name: idx for idx, name in species_map.items()}
+    y = dataset.df["物种"].map(codes).to_numpy()
+    categories = {}
+    for feat in model.feature_names_in_:
+        if "_" in feat:
+            cat, value = feat.split("_", 1)
+            categories.setdefault(cat, []).append(value)
+    labels = [species_map[idx] for idx in range(len(species_map))]
+    return model, X.to_numpy(dtype=np.float32), y, {"categories": categories, "labels": labels}
+
+
+def _load_grade():
+    """model.pkl（joblib）+ 学生数据表（与zzx12.train_and_load_model相同的编码）"""
+    import joblib
+
+    model = joblib.load("model.pkl")
+    df = pd.read_excel("学生数据表.xlsx").dropna()
+    df["性别"] = df["性别"].map({"男": 1, "女": 0})
+    df["专业"] = pd.factorize(df["专业"], sort=True)[0]
+    X = df[["性别", "专业", "每周学习时长（小时）", "上课出勤率", "期中考试分数", "作业完成率"]]
+    return model, X.to_numpy(dtype=np.float32), df["期末考试分数"].to_numpy(), {}
+
+
+PRESETS = {
+    "insurance": {"load": _load_insurance, "source_files": ["rfr_model.pkl", "feature_names.pkl"],
+                  "artifact": "rfr_model.forest"},
+    "penguin": {"load": _load_penguin, "source_files": ["rfc_model.pkl", "output_uniques.pkl"],
+                "artifact": "rfc_model.forest"},
+    "grade": {"load": _load_grade, "source_files": ["model.pkl"], "artifact": "model.forest"},
+}
+
+
+def main(argv=None):
+    from forest_artifact import save_forest_artifact
+
+    parser = argparse.ArgumentParser(description="随机森林剪枝/量化/减树，输出精度与内存、延迟的权衡报告")
+    parser.add_argument("preset", choices=list(PRESETS), help="要压缩的模型")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=None, help="只评估这些变体")
+    parser.add_argument("--output", default=None, help="报告CSV输出路径")
+    parser.add_argument("--export", choices=list(VARIANTS), default=None,
+                        help="把该变体写成前端使用的工件（来源pickle更新后前端会自动换回完整模型）")
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    model, X, y, metadata = preset["load"]()
+    flat = compile_forest(model)
+    # 报告里始终以完整模型为基准
+    variants = args.variants or list(VARIANTS)
+    variants = ["full"] + [v for v in variants if v != "full"]
+    report = compression_report(flat, X, y, variants)
+    print(f"样本数 {len(X)}（在训练数据上评估，反映的是相对完整模型的损失）")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.output:
+        report.to_csv(args.output, index=False, encoding="utf-8-sig")
+        print(f"报告已写入：{args.output}")
+
+    if args.export:
+        variant = VARIANTS[args.export](flat, np.asarray(X, dtype=np.float32))
+        save_forest_artifact(preset["artifact"], variant, source_files=preset["source_files"],
+                             compression={"variant": args.export}, **metadata)
+        print(f"已将变体 {args.export} 写入工件：{preset['artifact']}（{variant.nbytes / 1024:.1f} KB）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
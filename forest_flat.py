@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+随机森林扁平化推理引擎
+把训练好的RandomForestRegressor/RandomForestClassifier的全部树拼接成连续的NumPy数组
+（特征编号、阈值、左右子节点、叶子值），用向量化遍历一次性计算所有行、所有树，
+省去sklearn每次predict的输入校验与逐树调度开销；结果与sklearn逐位一致
+
+用法：
+    flat = compile_forest(model)
+    flat.predict(X)          # 回归：预测值；分类：类别标签
+    flat.predict_proba(X)    # 仅分类
+    python forest_flat.py rfr_model.pkl   # 校验与sklearn结果一致并比较单行延迟
+"""
+
+import numpy as np
+import pandas as pd
+
+TREE_LEAF = -1
+TARGET_CELLS_PER_BATCH = 1 << 20  # 每批（行数 × 树数）的上限，控制遍历时的中间数组大小
+
+
+class FlatForest:
+    """扁平化的森林：所有树的节点按顺序拼接，子节点下标为全局下标，叶子节点的子节点指向自己"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 missing_left=None, classes=None, feature_names=None, n_features=None, is_leaf=None,
+                 value_scale=None, value_offset=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value              # 回归：(节点数,)；分类：(节点数, 类别数)，已归一化为概率
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.missing_left = missing_left
+        self.classes = classes
+        self.feature_names = feature_names
+        self.n_features = n_features
+        self.is_leaf = left == np.arange(len(left)) if is_leaf is None else is_leaf
+        # 叶子值量化为整数时：真实值 = 整数值 × value_scale + value_offset（见forest_compress.quantize）
+        self.value_scale = value_scale
+        self.value_offset = value_offset
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def is_classifier(self):
+        return self.classes is not None
+
+    @property
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.left, self.right, self.value, self.roots]
+        if self.missing_left is not None:
+            arrays.append(self.missing_left)
+        return sum(a.nbytes for a in arrays)
+
+    def _as_matrix(self, X):
+        """与sklearn一致：特征转为float32；DataFrame按训练时的列顺序取列"""
+        if isinstance(X, pd.DataFrame) and self.feature_names is not None:
+            X = X[list(self.feature_names)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError(f"特征数量不匹配：模型需要{self.n_features}个，输入为{X.shape[1]}个")
+        return X
+
+    def apply(self, X):
+        """返回每行在每棵树上落到的叶子节点（全局下标），形状(行数, 树数)"""
+        X = self._as_matrix(X)
+        return self._apply(X)
+
+    def _apply(self, X):
+        n_rows = X.shape[0]
+        nodes = np.repeat(self.roots[None, :], n_rows, axis=0)
+        rows = np.arange(n_rows)[:, None]
+        for _ in range(self.max_depth):
+            if self.is_leaf[nodes].all():
+                break
+            x = X[rows, self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]  # float32与float64阈值比较，与sklearn相同
+            if self.missing_left is not None:
+                missing = np.isnan(x)
+                if missing.any():
+                    go_left = np.where(missing, self.missing_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def _average(self, X):
+        """所有树叶子值的平均；按树的顺序依次累加（cumsum），与sklearn的累加顺序一致"""
+        n_rows = X.shape[0]
+        batch_rows = max(1, TARGET_CELLS_PER_BATCH // max(self.n_trees, 1))
+        out_shape = (n_rows,) + self.value.shape[1:]
+        out = np.empty(out_shape, dtype=np.float64)
+        for start in range(0, n_rows, batch_rows):
+            end = min(start + batch_rows, n_rows)
+            leaf_values = self.value[self._apply(X[start:end])]
+            out[start:end] = np.cumsum(leaf_values, axis=1, dtype=np.float64)[:, -1]
+        if self.value_scale is not None:
+            out = out * self.value_scale + self.value_offset * self.n_trees
+        out /= self.n_trees
+        return out
+
+    def predict(self, X):
+        X = self._as_matrix(X)
+        averaged = self._average(X)
+        if self.is_classifier:
+            return self.classes.take(np.argmax(averaged, axis=1), axis=0)
+        return averaged
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("回归森林没有predict_proba")
+        return self._average(self._as_matrix(X))
+
+
+def compile_forest(model):
+    """把sklearn随机森林导出为FlatForest（只支持单输出）"""
+    estimators = getattr(model, "estimators_", None)
+    if not estimators:
+        raise ValueError("模型没有estimators_，不是已训练的随机森林")
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("暂不支持多输出森林")
+    is_classifier = hasattr(model, "classes_")
+
+    features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in estimators:
+        tree = est.tree_
+        state = tree.__getstate__()
+        nodes = state["nodes"]
+        n_nodes = len(nodes)
+        own = np.arange(offset, offset + n_nodes, dtype=np.int32)
+        leaf = nodes["left_child"] == TREE_LEAF
+
+        features.append(np.where(leaf, 0, nodes["feature"]).astype(np.int32))
+        thresholds.append(nodes["threshold"].astype(np.float64))
+        lefts.append(np.where(leaf, own, nodes["left_child"] + offset).astype(np.int32))
+        rights.append(np.where(leaf, own, nodes["right_child"] + offset).astype(np.int32))
+        if "missing_go_to_left" in nodes.dtype.names:
+            missing.append(nodes["missing_go_to_left"].astype(bool))
+
+        node_values = state["values"][:, 0, :]
+        if is_classifier:
+            # 与DecisionTreeClassifier.predict_proba相同的归一化
+            node_values = node_values[:, :len(model.classes_)]
+            normalizer = node_values.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(node_values / normalizer)
+        else:
+            values.append(node_values[:, 0].astype(np.float64))
+
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    feature_names = getattr(model, "feature_names_in_", None)
+    return FlatForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        missing_left=np.concatenate(missing) if len(missing) == len(estimators) else None,
+        classes=np.asarray(model.classes_) if is_classifier else None,
+        feature_names=None if feature_names is None else list(feature_names),
+        n_features=getattr(model, "n_features_in_", None),
+    )
+
+
+def max_abs_diff(model, flat, X):
+    """扁平引擎与sklearn结果的最大差值（分类比较概率）；0表示逐位一致"""
+    if flat.is_classifier:
+        return float(np.max(np.abs(model.predict_proba(X) - flat.predict_proba(X))))
+    return float(np.max(np.abs(model.predict(X) - flat.predict(X))))
+
+
+def _main():
+    import pickle
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("用法：python forest_flat.py <模型pickle文件>")
+        return 1
+    with open(sys.argv[1], "rb") as f:
+        model = pickle.load(f)
+    if isinstance(model, tuple):  # zzx10保存的是(模型, 特征名)
+        model = model[0]
+    flat = compile_forest(model)
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(10_000, model.n_features_in_)).astype(np.float32)
+    print(f"树数：{flat.n_trees}，节点数：{len(flat.feature)}，数组大小：{flat.nbytes / 1024:.1f} KB")
+    print(f"与sklearn最大差值：{max_abs_diff(model, flat, X)}")
+
+    for name, predict in [("sklearn", model.predict), ("flat", flat.predict)]:
+        start = time.perf_counter()
+        for i in range(200):
+            predict(X[i:i + 1])
+        single_ms = (time.perf_counter() - start) / 200 * 1000
+        start = time.perf_counter()
+        predict(X)
+        batch_s = time.perf_counter() - start
+        print(f"{name:8s} 单行 {single_ms:.3f} ms，1万行 {batch_s:.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+医疗费用模型超参数搜索（连续减半 + 交叉验证，多进程）
+在 n_estimators × max_depth × max_features 网格上搜索：第一轮每组参数只跑1个交叉验证折，
+每轮保留误差最小的1/eta进入下一轮并增加折数，直到用满全部折；每个（参数, 折）在进程池中并行训练。
+每组参数同时记录单行预测延迟（扁平化推理引擎，与前端相同的预测路径）和模型大小，
+最后输出 误差 × 延迟 × 大小 的帕累托表，并给出满足误差预算的最小模型
+
+用法：
+    python hparam_search.py                                   # 默认网格，5折，eta=3
+    python hparam_search.py --folds 5 --eta 2 --workers 8 --output hparam_results.csv
+    python hparam_search.py --max-mae 2800                    # 推荐满足MAE≤2800的最小模型
+"""
+
+import argparse
+import itertools
+import math
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold
+
+from forest_flat import compile_forest
+from train_model import encode_features, load_data
+
+DEFAULT_GRID = {
+    "n_estimators": [10, 25, 50, 100, 200],
+    "max_depth": [None, 6, 10, 16],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+LATENCY_ROWS = 200  # 单行延迟取这么多次单行预测的中位数
+
+# 进程池每个工作进程各持有一份训练数据（initializer里设置一次，不随每个任务重复传输）
+_X = None
+_y = None
+_FOLDS = None
+
+
+def _init_worker(X, y, folds):
+    global _X, _y, _FOLDS
+    _X, _y, _FOLDS = X, y, folds
+
+
+def _evaluate(params, fold):
+    """在一个交叉验证折上训练并评估一组参数（工作进程内执行，模型单线程，并行度由进程池提供）"""
+    train_idx, test_idx = _FOLDS[fold]
+    model = RandomForestRegressor(random_state=42, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(_X[train_idx], _y[train_idx])
+    fit_s = time.perf_counter() - start
+
+    flat = compile_forest(model)
+    pred = flat.predict(_X[test_idx])
+    rows = _X[test_idx[:LATENCY_ROWS]]
+    timings = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        flat.predict(rows[i:i + 1])
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "mae": float(mean_absolute_error(_y[test_idx], pred)),
+        "r2": float(r2_score(_y[test_idx], pred)),
+        "fit_s": fit_s,
+        "latency_ms": float(np.median(timings) * 1000),
+        "size_kb": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024,
+        "flat_kb": flat.nbytes / 1024,
+        "nodes": int(len(flat.feature)),
+    }
+
+
+def param_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def successive_halving(X, y, grid=None, n_folds=5, eta=3, workers=None, log=print):
+    """连续减半：资源为交叉验证折数。已经算过的（参数, 折）不会重复计算。
+    返回每组参数的汇总结果（DataFrame，按MAE升序），包含到达的轮次和实际使用的折数；
+    pareto列只对用满全部折的参数计算，其余为False"""
+    candidates = param_grid(grid or DEFAULT_GRID)
+    folds = list(KFold(n_splits=n_folds, shuffle=True, random_state=42).split(X))
+    results = {i: {} for i in range(len(candidates))}   # 参数下标 → {折: 指标}
+    reached = {i: 0 for i in range(len(candidates))}
+    alive = list(range(len(candidates)))
+    n_rungs = 1 + math.ceil(math.log(n_folds, eta)) if n_folds > 1 else 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        for rung in range(n_rungs):
+            folds_needed = min(n_folds, eta ** rung)
+            tasks = [(i, fold) for i in alive for fold in range(folds_needed) if fold not in results[i]]
+            start = time.perf_counter()
+            futures = {task: pool.submit(_evaluate, candidates[task[0]], task[1]) for task in tasks}
+            for (i, fold), future in futures.items():
+                results[i][fold] = future.result()
+            for i in alive:
+                reached[i] = rung
+            log(f"第{rung + 1}轮：{len(alive)}组参数 × {folds_needed}折，新训练{len(tasks)}个模型，"
+                f"用时{time.perf_counter() - start:.1f}s")
+
+            if folds_needed >= n_folds:
+                break
+            ranked = sorted(alive, key=lambda i: np.mean([r["mae"] for r in results[i].values()]))
+            alive = ranked[:max(1, len(ranked) // eta)]
+
+    rows = []
+    for i, params in enumerate(candidates):
+        fold_results = list(results[i].values())
+        summary = {name: float(np.mean([r[name] for r in fold_results])) for name in fold_results[0]}
+        rows.append({**params, "rung": reached[i] + 1, "folds": len(fold_results), **summary})
+    table = pd.DataFrame(rows)
+    table["max_depth"] = table["max_depth"].astype("Int64")  # None显示为<NA>
+    # 只在用满全部折的参数之间比较：被淘汰的参数只有一两折的MAE，偶然偏低时会把完整评估过的参数“支配”掉
+    full = table["folds"] == n_folds
+    table["pareto"] = False
+    table.loc[full, "pareto"] = pareto_mask(table[full], ["mae", "latency_ms", "size_kb"])
+    return table.sort_values("mae").reset_index(drop=True)
+
+
+def pareto_mask(table, objectives):
+    """帕累托最优：不存在另一行在所有目标上都不差、且至少一个目标更好（各目标均为越小越好）"""
+    values = table[objectives].to_numpy()
+    no_worse = (values[:, None, :] <= values[None, :, :]).all(axis=2)
+    better = (values[:, None, :] < values[None, :, :]).any(axis=2)
+    dominated = (no_worse & better).any(axis=0)
+    return ~dominated
+
+
+def recommend(table, max_mae, n_folds):
+    """满足误差预算的最小模型（只在用满全部折的参数中挑选，避免单折的偶然结果）"""
+    eligible = table[(table["folds"] == n_folds) & (table["mae"] <= max_mae)]
+    if eligible.empty:
+        return None
+    return eligible.sort_values(["size_kb", "latency_ms"]).iloc[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="医疗费用模型超参数搜索（连续减半 + 交叉验证）")
+    parser.add_argument("--data", default="insurance.csv", help="训练数据CSV（英文或中文表头均可）")
+    parser.add_argument("--folds", type=int, default=5, help="交叉验证折数（连续减半的最大资源）")
+    parser.add_argument("--eta", type=int, default=3, help="每轮保留1/eta的参数组")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认等于CPU核数")
+    parser.add_argument("--max-mae", type=float, default=None, help="误差预算：推荐MAE不超过该值的最小模型")
+    parser.add_argument("--output", default="hparam_results.csv", help="结果表输出路径")
+    args = parser.parse_args(argv)
+
+    X, y, _ = encode_features(load_data(args.data))
+    X = X.to_numpy(dtype=np.float32)
+    y = y.to_numpy(dtype=np.float64)
+    print(f"\n样本数 {len(X)}，特征数 {X.shape[1]}，进程数 {args.workers or os.cpu_count()}")
+
+    table = successive_halving(X, y, n_folds=args.folds, eta=args.eta, workers=args.workers)
+    table.to_csv(args.output, index=False, encoding="utf-8-sig")
+
+    columns = ["n_estimators", "max_depth", "max_features", "folds", "mae", "r2", "latency_ms", "size_kb"]
+    pareto = table[table["pareto"]].sort_values("size_kb")
+    print(f"\n帕累托最优（误差 × 单行延迟 × 模型大小，仅比较用满{args.folds}折的参数）：")
+    print(pareto[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n完整结果已写入：{args.output}")
+
+    if args.max_mae is not None:
+        best = recommend(table, args.max_mae, args.folds)
+        if best is None:
+            print(f"\n没有参数组在{args.folds}折上达到 MAE≤{args.max_mae}")
+            return 1
+        max_depth = "" if pd.isna(best["max_depth"]) else f" --max-depth {int(best['max_depth'])}"
+        print(f"\n满足 MAE≤{args.max_mae} 的最小模型：MAE {best['mae']:.1f}，"
+              f"单行 {best['latency_ms']:.3f} ms，{best['size_kb']:.0f} KB")
+        print(f"训练命令：python train_model.py --n-estimators {int(best['n_estimators'])}"
+              f"{max_depth} --max-features {best['max_features']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+医疗费用预测 - 批量评分
+上传整份被保险人名单（CSV/Parquet），用模型保存的InsuranceEncoder一次性向量化独热编码，
+分块调用model.predict，结果可直接下载，代替逐人提交表单
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 100_000
+# 敏感性分析：每个变量的扫描取值（其余特征保持提交的画像不变）
+SENSITIVITY_SWEEPS = {
+    "age": np.arange(18, 81),
+    "bmi": np.round(np.arange(15.0, 45.01, 0.5), 1),
+    "children": np.arange(0, 6),
+}
+
+
+def read_insured_file(file, name=None):
+    """读取上传的名单：Parquet直接读；CSV先按utf-8，失败再按gbk"""
+    name = name or getattr(file, "name", str(file))
+    if os.path.splitext(name)[1].lower() == ".parquet":
+        return pd.read_parquet(file)
+    try:
+        return pd.read_csv(file, encoding="utf-8")
+    except UnicodeDecodeError:
+        if hasattr(file, "seek"):
+            file.seek(0)
+        return pd.read_csv(file, encoding="gbk")
+
+
+def predict_in_chunks(model, X, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """分块预测，避免一次性为整份名单分配中间数组；progress(已完成行数, 总行数)"""
+    n_rows = len(X)
+    result = np.empty(n_rows, dtype=np.float64)
+    for start in range(0, n_rows, chunk_rows):
+        end = min(start + chunk_rows, n_rows)
+        result[start:end] = model.predict(X[start:end])
+        if progress is not None:
+            progress(end, n_rows)
+    return result
+
+
+def score_insured(model, encoder, df, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """对整份名单评分：原始列 + 预测医疗费用；取值无法识别的行预测值为空。encoder为模型保存的InsuranceEncoder"""
+    X, invalid = encoder.transform(df)
+    predictions = np.full(len(df), np.nan)
+    valid_rows = np.flatnonzero(~invalid)
+    if len(valid_rows):
+        predictions[valid_rows] = predict_in_chunks(model, X[valid_rows], chunk_rows, progress)
+    result = df.copy()
+    result["预测医疗费用"] = np.round(predictions, 2)
+    return result
+
+
+def sensitivity_sweep(model, encoder, profile, sweeps=None, by="smoker"):
+    """以提交的画像为中心生成变体网格：每个扫描变量的一串取值 × by特征的全部取值，其余特征不变。
+    整个网格一次编码、一次predict。返回长表：变量、取值、by特征、预测医疗费用"""
+    sweeps = SENSITIVITY_SWEEPS if sweeps is None else sweeps
+    by_values = encoder.categories[by]
+    frames = []
+    for variable, values in sweeps.items():
+        grid = pd.MultiIndex.from_product([np.asarray(values), by_values], names=[variable, by]).to_frame(index=False)
+        for col, value in profile.items():
+            if col not in (variable, by):
+                grid[col] = value
+        grid.insert(0, "变量", variable)
+        grid.insert(1, "取值", grid[variable])
+        frames.append(grid)
+    grid = pd.concat(frames, ignore_index=True)
+
+    X, invalid = encoder.transform(grid)
+    predictions = np.full(len(grid), np.nan)
+    predictions[~invalid] = model.predict(X[~invalid])
+    grid["预测医疗费用"] = np.round(predictions, 2)
+    return grid[["变量", "取值", by, "预测医疗费用"]]
+
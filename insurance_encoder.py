@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+医疗费用模型特征编码器（训练与前端共用）
+train_model.py、zzx10.py训练、单人预测、批量预测都用同一个InsuranceEncoder：
+分类特征取值统一为中文（英文取值自动映射），列顺序固定为 数值特征 + 各分类特征的独热列；
+transform一次向量化写入预分配的float32矩阵，transform_row给单人表单用，只做几次下标赋值。
+编码器随模型一起保存（feature_names列表本身就能还原编码器，工件manifest里另存to_dict()）
+"""
+
+import numpy as np
+import pandas as pd
+
+NUMERICAL_FEATURES = ["age", "bmi", "children"]
+CATEGORICAL_FEATURES = ["sex", "smoker", "region"]
+TARGET = "charges"
+# 分类特征的标准取值及顺序（与前端表单一致）
+DEFAULT_CATEGORIES = {
+    "sex": ["女性", "男性"],
+    "smoker": ["否", "是"],
+    "region": ["东南部", "西南部", "东北部", "西北部"],
+}
+
+# 可以用中文表头（与（医疗费用预测数据）insurance-chinese.csv一致）或英文表头
+COLUMN_ALIASES = {
+    "年龄": "age", "性别": "sex", "BMI": "bmi", "子女数量": "children",
+    "是否吸烟": "smoker", "区域": "region", "医疗费用": "charges",
+}
+# 英文取值 → 中文取值（insurance.csv是英文取值）
+VALUE_ALIASES = {
+    "sex": {"female": "女性", "male": "男性"},
+    "smoker": {"no": "否", "yes": "是"},
+    "region": {"southeast": "东南部", "southwest": "西南部", "northeast": "东北部", "northwest": "西北部"},
+}
+
+
+def normalize_columns(df):
+    """统一为英文列名，检查必需列"""
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    missing = [c for c in NUMERICAL_FEATURES + CATEGORICAL_FEATURES if c not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必需列：{missing}")
+    return df
+
+
+def _align_values(values, vocabulary, aliases):
+    """把中/英文取值统一到编码器使用的那一套取值"""
+    values = values.astype(str).str.strip()
+    lowered = values.str.lower()
+    reverse = {v: k for k, v in aliases.items()}
+    if any(v in vocabulary for v in aliases.values()):
+        return lowered.map(aliases).fillna(values)   # 编码器用中文取值
+    if any(v in vocabulary for v in aliases):
+        return values.map(reverse).fillna(lowered)   # 编码器用英文取值（旧模型）
+    return values
+
+
+class InsuranceEncoder:
+    """categories: {分类特征: [取值, ...]}，决定独热列及其顺序；未fit时使用DEFAULT_CATEGORIES"""
+
+    def __init__(self, categories=None):
+        self.categories = {cat: list(values) for cat, values in (categories or DEFAULT_CATEGORIES).items()}
+        self.feature_names = list(NUMERICAL_FEATURES)
+        for cat in CATEGORICAL_FEATURES:
+            self.feature_names.extend(f"{cat}_{value}" for value in self.categories[cat])
+        self._position = {name: i for i, name in enumerate(self.feature_names)}
+        # 单人预测用：(分类特征, 取值) → 列号，英文取值也能直接查到
+        self._row_lookup = {}
+        for cat in CATEGORICAL_FEATURES:
+            aliases = VALUE_ALIASES.get(cat, {})
+            reverse = {v: k for k, v in aliases.items()}
+            for value in self.categories[cat]:
+                column = self._position[f"{cat}_{value}"]
+                for key in {value, aliases.get(value), reverse.get(value)} - {None}:
+                    self._row_lookup[(cat, key)] = column
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    def fit(self, df):
+        """从训练数据中取各分类特征出现过的取值：标准取值按固定顺序在前，其余按字典序在后"""
+        df = normalize_columns(df)
+        categories = {}
+        for cat in CATEGORICAL_FEATURES:
+            standard = DEFAULT_CATEGORIES[cat]
+            observed = set(_align_values(df[cat].dropna(), standard, VALUE_ALIASES.get(cat, {})))
+            categories[cat] = [v for v in standard if v in observed] + sorted(observed - set(standard))
+        self.__init__(categories)
+        return self
+
+    def transform(self, df, dtype=np.float32):
+        """向量化编码：一次性填充预分配矩阵。返回（特征矩阵, 缺失或取值无法识别的行掩码）"""
+        df = normalize_columns(df)
+        n_rows = len(df)
+        X = np.zeros((n_rows, self.n_features), dtype=dtype)
+        invalid = np.zeros(n_rows, dtype=bool)
+
+        for col in NUMERICAL_FEATURES:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+            invalid |= np.isnan(values)
+            X[:, self._position[col]] = values
+
+        rows = np.arange(n_rows)
+        for cat in CATEGORICAL_FEATURES:
+            labels = self.categories[cat]
+            values = _align_values(df[cat], labels, VALUE_ALIASES.get(cat, {}))
+            codes = pd.Categorical(values, categories=labels).codes
+            known = codes >= 0
+            invalid |= ~known
+            columns = np.array([self._position[f"{cat}_{label}"] for label in labels], dtype=np.int64)
+            X[rows[known], columns[codes[known]]] = 1.0
+        return X, invalid
+
+    def transform_row(self, age, sex, bmi, children, smoker, region, dtype=np.float32):
+        """单人表单编码，返回(1, 特征数)的矩阵；取值无法识别时抛ValueError"""
+        X = np.zeros((1, self.n_features), dtype=dtype)
+        X[0, self._position["age"]] = age
+        X[0, self._position["bmi"]] = bmi
+        X[0, self._position["children"]] = children
+        for cat, value in (("sex", sex), ("smoker", smoker), ("region", region)):
+            column = self._row_lookup.get((cat, value))
+            if column is None:
+                raise ValueError(f"无法识别的{cat}取值：{value}")
+            X[0, column] = 1.0
+        return X
+
+    def to_dict(self):
+        return {"categories": self.categories, "feature_names": self.feature_names}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["categories"])
+
+    @classmethod
+    def from_feature_names(cls, feature_names):
+        """由模型保存的特征名还原编码器（如sex_女性 → sex取值女性），特征顺序须与模型一致"""
+        categories = {cat: [] for cat in CATEGORICAL_FEATURES}
+        for name in feature_names:
+            cat, _, value = name.partition("_")
+            if cat in categories and value:
+                categories[cat].append(value)
+        encoder = cls(categories)
+        if encoder.feature_names != list(feature_names):
+            raise ValueError(f"特征名与编码器的列顺序不一致：{list(feature_names)}")
+        return encoder
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+进程级模型注册表
+每个模型工件在进程内只加载（反序列化）一次，之后所有会话、所有重跑直接复用；
+模型文件的mtime/大小变化时自动重新加载。记录加载耗时与内存占用，便于观察
+"""
+
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+def file_signature(paths):
+    """文件签名（路径, mtime, 大小），任一文件变化即视为模型已更新"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((os.path.abspath(path), None, None))
+    return tuple(signature)
+
+
+def estimate_model_bytes(obj):
+    """估算模型内存：树模型累加各棵树的节点数组，其它对象按序列化后的大小估算"""
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_model_bytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return 0  # 工件的manifest等元数据，忽略不计
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):  # FlatForest：数组总字节数（内存映射时为映射大小）
+        return nbytes
+    estimators = getattr(obj, "estimators_", None)
+    if estimators is not None:
+        total = 0
+        for est in estimators:
+            tree = getattr(est, "tree_", None)
+            if tree is None:
+                total += estimate_model_bytes(est)
+                continue
+            state = tree.__getstate__()
+            total += state["nodes"].nbytes + state["values"].nbytes
+        return total
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+@dataclass
+class RegistryEntry:
+    artifact: object
+    signature: tuple
+    load_seconds: float
+    size_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class ModelRegistry:
+    """name → 已加载的模型工件；同名模型并发首次加载时只加载一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._loading_locks = {}
+
+    def get(self, name, loader, files=()):
+        """取模型；首次或模型文件变化时调用loader()加载（validate等一次性检查也放在loader里）"""
+        entry = self._entries.get(name)
+        if entry is not None and entry.signature == file_signature(files):
+            entry.hits += 1
+            return entry.artifact
+
+        with self._lock:
+            loading_lock = self._loading_locks.setdefault(name, threading.Lock())
+        with loading_lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.signature == file_signature(files):
+                entry.hits += 1
+                return entry.artifact
+            start = time.perf_counter()
+            artifact = loader()
+            load_seconds = time.perf_counter() - start
+            # 签名在加载之后计算：loader可能刚训练并写出了模型文件
+            self._entries[name] = RegistryEntry(
+                artifact=artifact,
+                signature=file_signature(files),
+                load_seconds=load_seconds,
+                size_bytes=estimate_model_bytes(artifact),
+            )
+            return artifact
+
+    def metrics(self, name=None):
+        """加载耗时、内存大小、复用次数；不传name时返回全部模型"""
+        names = [name] if name is not None else list(self._entries)
+        result = {}
+        for key in names:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            result[key] = {
+                "load_ms": round(entry.load_seconds * 1000, 1),
+                "size_mb": round(entry.size_bytes / 1024 / 1024, 2),
+                "hits": entry.hits,
+                "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.loaded_at)),
+            }
+        return result if name is None else result.get(name)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+# 全部Streamlit应用共用的注册表（模块只被import一次，进程内唯一）
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+企鹅物种 - 批量识别
+上传野外调查表（CSV），按模型的特征名一次性向量化岛屿/性别独热编码，
+分块计算三个物种的概率（predict_proba），记录每一批的吞吐量，结果可直接下载
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from penguin_data import CATEGORICAL_COLUMNS, COLUMN_RENAMES, NUMERICAL_COLUMNS
+
+DEFAULT_CHUNK_ROWS = 20_000
+
+# 上传表可用数据集原始表头、预测页的列名，或英文表头（palmerpenguins）
+COLUMN_ALIASES = {
+    **COLUMN_RENAMES,
+    "island": "岛屿", "bill_length_mm": "喙长度(mm)", "bill_depth_mm": "喙深度(mm)",
+    "flipper_length_mm": "鳍长(mm)", "body_mass_g": "体重(g)", "sex": "性别", "species": "物种",
+}
+# 英文取值 → 中文取值
+VALUE_ALIASES = {
+    "岛屿": {"biscoe": "比斯科群岛", "dream": "德里姆岛", "torgersen": "托尔森岛"},
+    "性别": {"female": "雌性", "male": "雄性"},
+}
+
+
+def read_survey_file(file):
+    """读取上传的调查表：先按utf-8，失败再按gbk（数据集本身是gbk编码）"""
+    try:
+        return pd.read_csv(file, encoding="utf-8-sig")
+    except UnicodeDecodeError:
+        if hasattr(file, "seek"):
+            file.seek(0)
+        return pd.read_csv(file, encoding="gbk")
+
+
+def normalize_columns(df):
+    """统一为预测页使用的列名，检查必需列"""
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    missing = [c for c in NUMERICAL_COLUMNS + CATEGORICAL_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"上传文件缺少必需列：{missing}")
+    return df
+
+
+def encode_penguins(df, feature_names, dtype=np.float32):
+    """向量化编码：一次性填充预分配矩阵，列顺序与模型特征名一致。返回（特征矩阵, 缺失或取值无法识别的行掩码）"""
+    df = normalize_columns(df)
+    n_rows = len(df)
+    X = np.zeros((n_rows, len(feature_names)), dtype=dtype)
+    invalid = np.zeros(n_rows, dtype=bool)
+    position = {name: i for i, name in enumerate(feature_names)}
+
+    for col in NUMERICAL_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+        invalid |= np.isnan(values)
+        X[:, position[col]] = values
+
+    rows = np.arange(n_rows)
+    for cat in CATEGORICAL_COLUMNS:
+        prefix = f"{cat}_"
+        labels = [name[len(prefix):] for name in feature_names if name.startswith(prefix)]
+        values = df[cat].astype(str).str.strip()
+        values = values.str.lower().map(VALUE_ALIASES.get(cat, {})).fillna(values)
+        codes = pd.Categorical(values, categories=labels).codes
+        known = codes >= 0
+        invalid |= ~known
+        columns = np.array([position[prefix + label] for label in labels], dtype=np.int64)
+        X[rows[known], columns[codes[known]]] = 1.0
+    return X, invalid
+
+
+def proba_in_chunks(model, X, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """分块计算predict_proba；返回（概率矩阵, 每批的吞吐量统计）。progress(已完成行数, 总行数)"""
+    n_rows = len(X)
+    proba = np.empty((n_rows, len(model.classes)), dtype=np.float64)
+    batches = []
+    for start in range(0, n_rows, chunk_rows):
+        end = min(start + chunk_rows, n_rows)
+        began = time.perf_counter()
+        proba[start:end] = model.predict_proba(X[start:end])
+        seconds = time.perf_counter() - began
+        batches.append({
+            "批次": len(batches) + 1,
+            "行数": end - start,
+            "用时(ms)": round(seconds * 1000, 2),
+            "每秒行数": round((end - start) / seconds) if seconds > 0 else None,
+        })
+        if progress is not None:
+            progress(end, n_rows)
+    return proba, pd.DataFrame(batches)
+
+
+def classify_penguins(model, species_map, df, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """整表识别：原始列 + 预测物种 + 每个物种的概率；取值缺失或无法识别的行结果为空。
+    返回（结果表, 每批吞吐量统计）"""
+    X, invalid = encode_penguins(df, model.feature_names)
+    species = [species_map[code] for code in model.classes.tolist()]
+    proba = np.full((len(df), len(species)), np.nan)
+    valid_rows = np.flatnonzero(~invalid)
+    batches = pd.DataFrame(columns=["批次", "行数", "用时(ms)", "每秒行数"])
+    if len(valid_rows):
+        proba[valid_rows], batches = proba_in_chunks(model, X[valid_rows], chunk_rows, progress)
+
+    result = df.copy()
+    predicted = np.full(len(df), None, dtype=object)
+    predicted[valid_rows] = np.asarray(species, dtype=object)[np.argmax(proba[valid_rows], axis=1)]
+    result["预测物种"] = predicted
+    for i, name in enumerate(species):
+        result[f"{name}概率"] = np.round(proba[:, i], 4)
+    return result, batches
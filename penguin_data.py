@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+企鹅数据集加载层
+按文件指纹（路径, mtime, 大小）在进程内缓存：CSV只按gbk解析一次，清洗、列名映射、独热编码、
+物种编码也只做一次，数据集简介页和训练共用同一份结果；文件变化后自动重新解析。
+缓存的DataFrame在所有会话间共享，调用方不要原地修改
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from model_registry import file_signature
+from shared_cache import SharedCache, estimate_nbytes
+
+REQUIRED_COLUMNS = ["企鹅的种类", "企鹅栖息的岛屿", "喙的长度", "喙的深度", "翅膀的长度", "身体质量", "性别"]
+COLUMN_RENAMES = {
+    "企鹅的种类": "物种",
+    "企鹅栖息的岛屿": "岛屿",
+    "喙的长度": "喙长度(mm)",
+    "喙的深度": "喙深度(mm)",
+    "翅膀的长度": "鳍长(mm)",
+    "身体质量": "体重(g)",
+}
+NUMERICAL_COLUMNS = ["喙长度(mm)", "喙深度(mm)", "鳍长(mm)", "体重(g)"]
+CATEGORICAL_COLUMNS = ["岛屿", "性别"]
+
+# 数据集很小，缓存一小时；文件变化时指纹变化，直接换新key
+DATASET_CACHE = SharedCache(max_bytes=64 * 1024 * 1024, ttl=3600)
+
+
+@dataclass(frozen=True)
+class PenguinDataset:
+    raw: pd.DataFrame       # 原始表（简介页展示样本）
+    df: pd.DataFrame        # 清洗并映射列名后的表
+    X: pd.DataFrame         # 独热编码后的特征
+    y: np.ndarray           # 物种编号
+    species_map: dict       # 物种编号 → 物种名称
+    islands: list           # 数据中出现的岛屿
+
+    @property
+    def nbytes(self):
+        return sum(estimate_nbytes(v) for v in (self.raw, self.df, self.X, self.y))
+
+
+def read_penguin_csv(path):
+    return pd.read_csv(path, encoding="gbk")
+
+
+def preprocess(raw):
+    """数据清洗 → 列名映射 → 独热编码 → 物种编码（物种编号按名称排序，与LabelEncoder一致）"""
+    df = raw.dropna(subset=REQUIRED_COLUMNS).reset_index(drop=True)
+    df = df.rename(columns=COLUMN_RENAMES)
+    X = pd.get_dummies(df[NUMERICAL_COLUMNS + CATEGORICAL_COLUMNS], columns=CATEGORICAL_COLUMNS, drop_first=False)
+    y, classes = pd.factorize(df["物种"], sort=True)
+    species_map = {idx: name for idx, name in enumerate(classes)}
+    return PenguinDataset(
+        raw=raw,
+        df=df,
+        X=X,
+        y=y,
+        species_map=species_map,
+        islands=list(df["岛屿"].unique()),
+    )
+
+
+def load_penguin_dataset(path):
+    """取数据集；同一文件（指纹不变）在进程内只解析一次"""
+    key = ("penguin_dataset", file_signature([path]))
+    return DATASET_CACHE.get_or_compute(key, lambda: preprocess(read_penguin_csv(path)))
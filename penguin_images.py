@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+企鹅分类器图片资源：启动时一次性缩放、重新编码，常驻内存
+原图是250KB~1.2MB的大尺寸PNG，页面只按300~960像素宽显示。预热时用Pillow把每张图缩放到显示宽度、
+编码成JPEG字节放在进程内（所有会话共享），预测后按物种名直接取字节，不再访问磁盘、不再转码。
+
+用JPEG而不是WebP：st.image收到JPEG/PNG以外的字节（以及宽于显示宽度的图片）时，每次显示都会再用
+Pillow转码一次；宽度不超过显示宽度的JPEG字节会原样发送，内容不变时媒体地址也不变，浏览器可以复用。
+
+    python penguin_images.py            # 输出每张图缩放前后的大小
+"""
+
+import argparse
+import io
+import os
+import threading
+import time
+
+from PIL import Image
+
+from model_registry import file_signature
+
+SPECIES_IMG_MAP = {
+    "阿德利企鹅": "ADELIE.png",
+    "帽带企鹅": "CHINSTRAP.png",
+    "巴布亚企鹅": "GENTOO.png"
+}
+# 资源名 → 候选文件（取第一个存在的）
+IMAGE_FILES = {
+    **{species: (path,) for species, path in SPECIES_IMG_MAP.items()},
+    "logo": ("right_logo.png", "logo.png"),
+    "全家福": ("penguins_all.png", "lter_penguins.png"),
+}
+# 显示宽度（像素），与页面里st.image的width一致
+RESULT_WIDTH = 300    # 预测结果图
+GALLERY_WIDTH = 480   # 简介页物种图鉴（三栏）
+LOGO_WIDTH = 300
+BANNER_WIDTH = 960    # 简介页全家福
+# 启动时预先生成的（资源名, 宽度）
+PRELOAD = (
+    [(species, RESULT_WIDTH) for species in SPECIES_IMG_MAP]
+    + [(species, GALLERY_WIDTH) for species in SPECIES_IMG_MAP]
+    + [("logo", LOGO_WIDTH), ("全家福", BANNER_WIDTH)]
+)
+JPEG_QUALITY = 82
+BACKGROUND = (255, 255, 255)  # 透明区域铺白底（与页面背景一致）
+
+_CACHE = {}                   # (资源名, 宽度) → (文件签名, 图片字节, 统计)
+_LOCK = threading.Lock()
+
+
+def resolve_path(key):
+    """资源名对应的图片文件；都不存在时返回None"""
+    for path in IMAGE_FILES.get(key, ()):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def encode_image(path, width, quality=JPEG_QUALITY):
+    """缩放到不超过width像素宽（不放大），透明背景铺白后编码为JPEG。返回（字节, 统计）"""
+    with Image.open(path) as img:
+        source_size = img.size
+        img = img.convert("RGBA") if img.mode in ("P", "LA", "RGBA") else img.convert("RGB")
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        if img.mode == "RGBA":
+            canvas = Image.new("RGB", img.size, BACKGROUND)
+            canvas.paste(img, mask=img.getchannel("A"))
+            img = canvas
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    return data, {
+        "source_size": source_size,
+        "size": img.size,
+        "source_bytes": os.path.getsize(path),
+        "bytes": len(data),
+    }
+
+
+def get_image(key, width=RESULT_WIDTH):
+    """显示用的图片字节（命中内存时不访问磁盘）；图片缺失时返回None"""
+    cached = _CACHE.get((key, width))
+    if cached is not None:
+        return cached[1]
+    return _prepare(key, width)
+
+
+def _prepare(key, width, refresh=False):
+    """生成并缓存一张图；refresh时若原图文件有变化则重新生成"""
+    path = resolve_path(key)
+    if path is None:
+        return None
+    signature = file_signature([path])
+    with _LOCK:
+        cached = _CACHE.get((key, width))
+        if cached is not None and (not refresh or cached[0] == signature):
+            return cached[1]
+    data, stats = encode_image(path, width)
+    with _LOCK:
+        _CACHE[(key, width)] = (signature, data, dict(stats, path=path))
+    return data
+
+
+def preload_images(items=PRELOAD, refresh=True):
+    """启动预热：生成全部显示用图片。返回缺失的资源名列表"""
+    missing = []
+    for key, width in items:
+        if _prepare(key, width, refresh=refresh) is None and key not in missing:
+            missing.append(key)
+    return missing
+
+
+def image_report():
+    """已缓存图片的缩放统计（每行一个（资源名, 宽度））"""
+    with _LOCK:
+        items = sorted(_CACHE.items(), key=lambda item: (item[0][0], item[0][1]))
+    return [{"资源": key, "显示宽度": width, **stats} for (key, width), (_, _, stats) in items]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预先缩放企鹅分类器的图片，输出缩放前后的大小")
+    parser.parse_args(argv)
+
+    start = time.perf_counter()
+    missing = preload_images()
+    elapsed = (time.perf_counter() - start) * 1000
+    total_source = total = 0
+    for row in image_report():
+        total_source += row["source_bytes"]
+        total += row["bytes"]
+        print(f"{row['资源']:<8} {row['path']:<20} {row['source_size'][0]}x{row['source_size'][1]} "
+              f"{row['source_bytes'] / 1024:>8.1f} KB → {row['size'][0]}x{row['size'][1]} "
+              f"{row['bytes'] / 1024:>7.1f} KB（{row['source_bytes'] / max(row['bytes'], 1):.1f}倍）")
+    print(f"共 {total_source / 1024:.1f} KB → {total / 1024:.1f} KB，用时 {elapsed:.0f} ms")
+    for key in missing:
+        print(f"⚠️ 缺少图片：{key}（{' / '.join(IMAGE_FILES[key])}）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
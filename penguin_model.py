@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+企鹅分类模型：加载/训练、扁平化推理引擎、启动预热与就绪状态
+不依赖Streamlit，zzx11.py和预热命令行共用。部署时先运行预热再启动服务：
+
+    python penguin_model.py && streamlit run zzx11.py    # 预热：训练或加载模型、导出内存映射工件、缩放页面图片
+    python penguin_model.py --check                       # 就绪探针：模型已预热且未过期时返回0
+
+预热在独立进程里完成训练和工件导出，服务进程里的首次加载只剩内存映射（毫秒级）；
+zzx11.py启动时还会在后台线程里再预热一次本进程，页面侧边栏显示就绪状态
+"""
+
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_artifact import is_artifact_fresh, load_or_export, manifest_path
+from model_registry import MODEL_REGISTRY, file_signature
+from penguin_data import load_penguin_dataset
+from penguin_images import RESULT_WIDTH, SPECIES_IMG_MAP, get_image, image_report, preload_images
+
+# 所有路径均为相对路径（代码文件与数据集/图片在同一目录）
+DATA_PATH = "(企鹅识别数据)penguins-chinese.csv"
+MODEL_PATH = "rfc_model.pkl"
+SPECIES_MAP_PATH = "output_uniques.pkl"
+# 预测用紧凑工件（.npy数组 + manifest.json，内存映射加载），由上面两个pickle自动导出
+ARTIFACT_DIR = "rfc_model.forest"
+REGISTRY_NAME = "penguin_rfc_flat"
+READINESS_FILE = ".penguin_ready.json"
+
+_STATUS = {"state": "cold"}  # 本进程的预热状态：cold / warming / ready / failed
+_STATUS_LOCK = threading.Lock()
+_WARMUP_THREAD = None
+
+
+def _log(log, level, message):
+    """log(level, message)，level为success/info/warning/error；未提供时静默"""
+    if log is not None:
+        log(level, message)
+
+
+# ============================ 模型 ============================
+def train_or_load_model(log=None):
+    """加载预训练模型；不存在或加载失败时用数据集训练并保存。返回（模型, 物种映射），无法训练时返回(None, None)"""
+    if os.path.exists(MODEL_PATH) and os.path.exists(SPECIES_MAP_PATH):
+        try:
+            with open(MODEL_PATH, "rb") as f:
+                model = pickle.load(f)
+            with open(SPECIES_MAP_PATH, "rb") as f:
+                species_map = pickle.load(f)
+            _log(log, "success", f"✅ 加载预训练模型（相对路径：{MODEL_PATH}）")
+            return model, species_map
+        except Exception as e:
+            _log(log, "warning", f"⚠️ 加载模型失败：{str(e)}，将重新训练")
+
+    if not os.path.exists(DATA_PATH):
+        _log(log, "error", f"❌ 未找到数据集：{DATA_PATH}，无法训练模型")
+        return None, None
+    dataset = load_penguin_dataset(DATA_PATH)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+    model.fit(dataset.X, dataset.y)
+
+    with open(MODEL_PATH, "wb") as f:
+        pickle.dump(model, f)
+    with open(SPECIES_MAP_PATH, "wb") as f:
+        pickle.dump(dataset.species_map, f)
+    _log(log, "success", f"✅ 模型训练完成并保存（相对路径：{MODEL_PATH}）")
+    return model, dataset.species_map
+
+
+def _export_artifact_source(log=None):
+    """导出工件的来源：pickle里的模型，加上物种名称和岛屿/性别的取值"""
+    model, species_map = train_or_load_model(log)
+    if model is None:
+        raise FileNotFoundError(f"无法加载或训练模型：{MODEL_PATH}")
+    categories = {}
+    for feat in model.feature_names_in_:
+        if "_" in feat:
+            cat, value = feat.split("_", 1)
+            categories.setdefault(cat, []).append(value)
+    labels = [species_map[idx] for idx in range(len(species_map))]
+    return model, {"categories": categories, "labels": labels}
+
+
+def load_flat_model(log=None):
+    """扁平化推理引擎：内存映射rfc_model.forest工件（每个进程只加载一次，模型文件变化时重新加载），
+    工件缺失或过期时先从pickle导出。返回（FlatForest, 物种映射），加载失败时返回(None, None)"""
+    try:
+        forest, manifest = MODEL_REGISTRY.get(
+            REGISTRY_NAME,
+            lambda: load_or_export(ARTIFACT_DIR, [MODEL_PATH, SPECIES_MAP_PATH], lambda: _export_artifact_source(log)),
+            files=[MODEL_PATH, SPECIES_MAP_PATH, manifest_path(ARTIFACT_DIR)]
+        )
+    except FileNotFoundError:
+        return None, None
+    return forest, dict(enumerate(manifest["labels"]))
+
+
+# ============================ 单次预测 ============================
+def encode_penguin(feature_names, island, sex, bill_length, bill_depth, flipper_length, body_mass):
+    """单只企鹅的表单输入编码为(1, 特征数)的矩阵，列顺序与模型特征名一致"""
+    values = {
+        "喙长度(mm)": bill_length,
+        "喙深度(mm)": bill_depth,
+        "鳍长(mm)": flipper_length,
+        "体重(g)": body_mass,
+        f"岛屿_{island}": 1.0,
+        f"性别_{sex}": 1.0,
+    }
+    return np.array([[values.get(name, 0.0) for name in feature_names]], dtype=np.float32)
+
+
+def predict_species(model, species_map, island, sex, bill_length, bill_depth, flipper_length, body_mass):
+    """预测一只企鹅，返回新的结果字典（物种名称、物种图片字节）。
+    不读写任何模块级状态：结果由调用方保存到各自会话里（zzx11.py存入st.session_state）"""
+    X = encode_penguin(model.feature_names, island, sex, bill_length, bill_depth, flipper_length, body_mass)
+    species = species_map[model.predict(X)[0]]
+    return {"species": species, "image": load_species_image(species)}
+
+
+# ============================ 物种图片 ============================
+def load_species_image(species, width=RESULT_WIDTH):
+    """预测结果用的物种图片：已缩放到显示宽度的JPEG字节（启动预热时生成，之后直接从内存取）；
+    未知物种或图片缺失时返回None"""
+    if species not in SPECIES_IMG_MAP:
+        return None
+    return get_image(species, width)
+
+
+# ============================ 预热与就绪状态 ============================
+def _set_status(**status):
+    with _STATUS_LOCK:
+        _STATUS.clear()
+        _STATUS.update(status)
+
+
+def warm_up(log=None, write_file=False):
+    """训练或加载模型、导出并映射工件、缩放全部页面图片；返回就绪状态（write_file时同时写入READINESS_FILE）"""
+    _set_status(state="warming", started_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+    status = {"pid": os.getpid()}
+    try:
+        start = time.perf_counter()
+        forest, species_map = load_flat_model(log)
+        status["model_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if forest is None:
+            raise RuntimeError("模型不可用（缺少模型文件和数据集）")
+        status["trees"] = forest.n_trees
+
+        start = time.perf_counter()
+        status["missing_images"] = preload_images()
+        status["images_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        images = image_report()
+        status["images_kb"] = round(sum(row["bytes"] for row in images) / 1024, 1)
+        status["images_source_kb"] = round(sum(row["source_bytes"] for row in images) / 1024, 1)
+        status["state"] = "ready"
+    except Exception as e:
+        status.update(state="failed", error=str(e))
+    status["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    _set_status(**status)
+
+    if write_file:
+        tmp_path = READINESS_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(status, model_files=file_signature([MODEL_PATH, SPECIES_MAP_PATH])), f,
+                      ensure_ascii=False, indent=2)
+        os.replace(tmp_path, READINESS_FILE)
+    return status
+
+
+def start_background_warmup():
+    """本进程首次调用时在后台线程预热（页面脚本每次重跑都可以调用，只会启动一次）"""
+    global _WARMUP_THREAD
+    with _STATUS_LOCK:
+        if _WARMUP_THREAD is not None:
+            return
+        _WARMUP_THREAD = threading.Thread(target=warm_up, name="penguin-warmup", daemon=True)
+    _WARMUP_THREAD.start()
+
+
+def readiness():
+    """本进程的预热状态（副本）"""
+    with _STATUS_LOCK:
+        return dict(_STATUS)
+
+
+def check_ready():
+    """就绪探针：预热命令已成功运行，且之后模型文件没有变化、工件未过期"""
+    try:
+        with open(READINESS_FILE, encoding="utf-8") as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False, "尚未预热"
+    if status.get("state") != "ready":
+        return False, f"预热失败：{status.get('error')}"
+    if status.get("model_files") != json.loads(json.dumps(file_signature([MODEL_PATH, SPECIES_MAP_PATH]))):
+        return False, "模型文件在预热后发生了变化"
+    if not is_artifact_fresh(ARTIFACT_DIR, [MODEL_PATH, SPECIES_MAP_PATH]):
+        return False, "模型工件已过期"
+    return True, f"已就绪（{status['finished_at']}）"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="企鹅分类器预热：训练或加载模型、导出工件、缩放页面图片")
+    parser.add_argument("--check", action="store_true", help="只检查是否已就绪（就绪返回0，否则返回1）")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        ready, message = check_ready()
+        print(message)
+        return 0 if ready else 1
+
+    status = warm_up(log=lambda level, message: print(message), write_file=True)
+    if status["state"] != "ready":
+        print(f"❌ 预热失败：{status.get('error')}")
+        return 1
+    print(f"✅ 预热完成：模型 {status['model_ms']} ms（{status['trees']} 棵树），"
+          f"图片 {status['images_ms']} ms（{status['images_source_kb']} KB → {status['images_kb']} KB）")
+    for key in status["missing_images"]:
+        print(f"⚠️ 缺少图片：{key}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
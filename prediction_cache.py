@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+预测结果缓存
+很多用户提交的是相同或几乎相同的输入（表单默认值），对规范化后的特征向量做LRU缓存，
+相同输入直接返回上次的预测，不再遍历森林。可为连续特征设置分桶宽度（如BMI按0.1取整），
+模型文件变化时自动清空；记录命中率
+"""
+
+import math
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+from model_registry import file_signature
+
+DEFAULT_MAXSIZE = 4096
+
+
+class PredictionCache:
+    """特征向量 → 预测值 的LRU缓存；buckets: {特征名: 分桶宽度}，需配合feature_names使用"""
+
+    def __init__(self, model_files=(), maxsize=DEFAULT_MAXSIZE, feature_names=None, buckets=None):
+        self.model_files = list(model_files)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.buckets = dict(buckets or {})
+        self._cache = LRUCache(maxsize=maxsize)
+        self.config = _cache_config(model_files, maxsize, feature_names, buckets)
+        self._lock = threading.Lock()
+        self._signature = file_signature(self.model_files)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def canonicalize(self, row):
+        """规范化特征向量：转float、按分桶宽度取整、-0.0与0.0视为相同、NaN统一为None"""
+        values = np.asarray(row, dtype=np.float64).ravel()
+        if self.buckets and self.feature_names is not None:
+            values = values.copy()
+            for i, name in enumerate(self.feature_names):
+                width = self.buckets.get(name)
+                if width:
+                    values[i] = np.round(values[i] / width) * width
+        return tuple(None if math.isnan(v) else float(v) + 0.0 for v in values)
+
+    def _check_model_changed(self):
+        signature = file_signature(self.model_files)
+        if signature != self._signature:
+            self._cache.clear()
+            self._signature = signature
+            self.invalidations += 1
+
+    def predict(self, model, row):
+        """单行预测；命中缓存直接返回，未命中时用分桶后的特征向量调用model.predict"""
+        key = self.canonicalize(row)
+        with self._lock:
+            self._check_model_changed()
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        features = np.array([[np.nan if v is None else v for v in key]])
+        value = model.predict(features)[0]
+        with self._lock:
+            self._cache[key] = value
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "invalidations": self.invalidations,
+        }
+
+
+def _cache_config(model_files=(), maxsize=DEFAULT_MAXSIZE, feature_names=None, buckets=None):
+    """缓存的构造参数（规范化后可比较），参数变化时需要重建缓存"""
+    return (
+        tuple(model_files),
+        maxsize,
+        tuple(feature_names) if feature_names is not None else None,
+        tuple(sorted((buckets or {}).items())),
+    )
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_prediction_cache(name, **kwargs):
+    """按名称取进程内唯一的预测缓存（Streamlit重跑页面脚本不会重建）；首次调用时用kwargs创建，
+    之后kwargs与已有缓存不同（如重新训练后特征名变化）时按新参数重建"""
+    with _CACHES_LOCK:
+        cache = _CACHES.get(name)
+        if cache is None or cache.config != _cache_config(**kwargs):
+            cache = _CACHES[name] = PredictionCache(**kwargs)
+        return cache
+
+
+def find_prediction_cache(name):
+    """只查询不创建（用于展示命中率），尚未创建时返回None"""
+    return _CACHES.get(name)
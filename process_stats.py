@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+进程资源统计（train_model.py训练报告、bench_sales.py基准测试共用）
+resource只在Unix上可用；Windows上改用psutil（可选依赖），两者都没有时返回None
+"""
+
+import sys
+
+try:
+    import resource  # 仅Unix
+except ImportError:
+    resource = None
+try:
+    import psutil    # 可选：Windows上用它取峰值内存
+except ImportError:
+    psutil = None
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存MB，保留1位小数（Linux上ru_maxrss单位为KB，macOS为字节；Windows上用psutil的峰值工作集）；
+    两者都不可用时返回None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1024 / 1024, 1)
+    return None
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 增量追加新订单
+新订单放进投递目录（CSV/XLSX/JSON文件），或逐行追加到队列文件queue.jsonl，
+仪表板每次重跑只读取新增部分，按订单号去重后更新数据表、筛选位图索引、立方体和日期汇总，
+无需重新解析整个Excel；索引与立方体的更新量只与新增行数有关
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from sales_cache import add_hour_column
+from sales_cube import build_sales_cube, merge_cubes
+from sales_filter import SalesFilterIndex
+from sales_rollup import build_rollups, merge_rollups
+
+QUEUE_FILE_NAME = "queue.jsonl"       # 队列文件：每行一个订单（JSON对象）
+PROCESSED_DIR_NAME = "processed"      # 已处理的投递文件移到这里
+QUARANTINE_DIR_NAME = "quarantine"    # 无法读取或追加的投递文件、队列中无法解析的行移到这里
+DROP_PATTERNS = (".csv", ".xlsx", ".json")
+
+
+def read_order_file(path):
+    """读取一个投递文件，返回以订单号为列的DataFrame"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path)
+    if ext == ".xlsx":
+        return pd.read_excel(path, engine="openpyxl")
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    return pd.DataFrame(records if isinstance(records, list) else [records])
+
+
+def _load_queue_offset(queue_path):
+    offset_path = queue_path + ".offset"
+    if not os.path.exists(offset_path):
+        return 0
+    with open(offset_path, "r", encoding="utf-8") as f:
+        return int(f.read().strip() or 0)
+
+
+def read_queue(queue_path, offset=None, end=None, bad_lines=None):
+    """从offset（默认为上次读到的位置）读取队列文件到end，只处理以换行结尾的完整行；返回（订单, 新偏移）。
+    无法解析的行跳过，传入bad_lines列表时追加到其中"""
+    if offset is None:
+        offset = _load_queue_offset(queue_path)
+    if os.path.getsize(queue_path) < offset:
+        offset = 0  # 队列文件被截断/轮转，从头读
+
+    with open(queue_path, "rb") as f:
+        f.seek(offset)
+        data = f.read() if end is None else f.read(max(end - offset, 0))
+    complete = data[:data.rfind(b"\n") + 1]
+    records = []
+    for line in complete.decode("utf-8", errors="replace").splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if bad_lines is not None:
+                bad_lines.append(line)
+    return pd.DataFrame(records), offset + len(complete)
+
+
+def _save_queue_offset(queue_path, offset):
+    with open(queue_path + ".offset", "w", encoding="utf-8") as f:
+        f.write(str(offset))
+
+
+def quarantine(inbox_dir, path=None, lines=None):
+    """隔离出错的输入：投递文件整体移到quarantine目录（文件名加时间，不覆盖），
+    队列中无法解析的行追加到quarantine/queue.rejected.jsonl"""
+    quarantine_dir = os.path.join(inbox_dir, QUARANTINE_DIR_NAME)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    if path is not None and os.path.exists(path):
+        shutil.move(path, _processed_path(quarantine_dir, os.path.basename(path)))
+    if lines:
+        with open(os.path.join(quarantine_dir, "queue.rejected.jsonl"), "a", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in lines)
+
+
+def _processed_path(processed_dir, name):
+    """已处理文件的目标路径：文件名加处理时间，仍重名时再加序号，同名的新投递不会覆盖旧文件"""
+    stem, ext = os.path.splitext(name)
+    base = f"{stem}.{time.strftime('%Y%m%d-%H%M%S')}"
+    path, counter = os.path.join(processed_dir, base + ext), 1
+    while os.path.exists(path):
+        path = os.path.join(processed_dir, f"{base}-{counter}{ext}")
+        counter += 1
+    return path
+
+
+def collect_inbox(inbox_dir):
+    """收集投递目录里的新订单；返回（[(来源文件, 订单DataFrame), ...], 读取失败的[(文件名, 错误)], 提交函数）。
+    队列文件中的订单来源文件为None。读取失败的投递文件和队列中无法解析的行直接隔离，不会每次重跑都报错。
+    提交函数在订单成功写入后调用：移走已处理文件（已被隔离的跳过）、保存队列偏移，失败时不会丢单"""
+    if not inbox_dir or not os.path.isdir(inbox_dir):
+        return [], [], lambda: None
+
+    batches, drop_files, failed = [], [], []
+    queue_offset = None
+    queue_path = os.path.join(inbox_dir, QUEUE_FILE_NAME)
+    if os.path.exists(queue_path):
+        bad_lines = []
+        queued, queue_offset = read_queue(queue_path, bad_lines=bad_lines)
+        if bad_lines:
+            quarantine(inbox_dir, lines=bad_lines)
+            failed.append((QUEUE_FILE_NAME, f"{len(bad_lines)} 行无法解析"))
+        if len(queued):
+            batches.append((None, queued))
+    for name in sorted(os.listdir(inbox_dir)):
+        path = os.path.join(inbox_dir, name)
+        if name == QUEUE_FILE_NAME or not os.path.isfile(path):
+            continue
+        if os.path.splitext(name)[1].lower() in DROP_PATTERNS:
+            try:
+                batches.append((path, read_order_file(path)))
+            except Exception as e:
+                quarantine(inbox_dir, path)
+                failed.append((name, str(e)))
+                continue
+            drop_files.append(path)
+
+    def commit():
+        if queue_offset is not None:
+            _save_queue_offset(queue_path, queue_offset)
+        if drop_files:
+            processed_dir = os.path.join(inbox_dir, PROCESSED_DIR_NAME)
+            os.makedirs(processed_dir, exist_ok=True)
+            for path in drop_files:
+                if os.path.exists(path):
+                    shutil.move(path, _processed_path(processed_dir, os.path.basename(path)))
+
+    return batches, failed, commit
+
+
+def collect_history(inbox_dir):
+    """已处理过的全部订单（队列文件中已确认的部分 + processed目录里的文件），每个来源一个DataFrame；
+    共享缓存过期后重建数据时用来重放，保证已追加的订单不会丢失"""
+    if not inbox_dir or not os.path.isdir(inbox_dir):
+        return []
+    frames = []
+    queue_path = os.path.join(inbox_dir, QUEUE_FILE_NAME)
+    if os.path.exists(queue_path):
+        queued, _ = read_queue(queue_path, offset=0, end=_load_queue_offset(queue_path))
+        if len(queued):
+            frames.append(queued)
+    processed_dir = os.path.join(inbox_dir, PROCESSED_DIR_NAME)
+    if os.path.isdir(processed_dir):
+        for name in sorted(os.listdir(processed_dir)):
+            if os.path.splitext(name)[1].lower() in DROP_PATTERNS:
+                frames.append(read_order_file(os.path.join(processed_dir, name)))
+    return frames
+
+
+def conform_orders(new_orders, template):
+    """把新订单整理成与现有数据表一致的结构：订单号索引、同样的列和列类型、派生小时数"""
+    orders = new_orders.set_index("订单号") if "订单号" in new_orders.columns else new_orders
+    orders = add_hour_column(orders.copy())
+    orders = orders.reindex(columns=template.columns)
+    for col, dtype in template.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            continue  # 分类列在追加时统一扩充类别
+        try:
+            orders[col] = orders[col].astype(dtype)
+        except (TypeError, ValueError):
+            pass  # 类型不兼容时保留原样，由concat升级列类型
+    return orders
+
+
+def _concat_with_categories(df, orders):
+    """追加行；分类列先扩充类别，避免concat把category退化成object"""
+    df = df.copy(deep=False)
+    orders = orders.copy()
+    for col, dtype in df.dtypes.items():
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        missing = pd.Index(orders[col].dropna().unique()).difference(dtype.categories)
+        if len(missing):
+            df[col] = df[col].cat.add_categories(missing)
+        orders[col] = pd.Categorical(orders[col], categories=df[col].cat.categories)
+    return pd.concat([df, orders])
+
+
+class LiveSalesStore:
+    """可增量追加的销售数据：数据表 + 筛选位图索引 + 立方体 + 日期汇总。
+    每次追加生成新的快照并整体替换，其他会话手里的旧快照保持一致可用"""
+
+    def __init__(self, df):
+        # 每个实例唯一：缓存过期重建后追加版本号从0重新计数，缓存key需要同时带上它
+        self.store_id = uuid.uuid4().hex
+        self.rejected = []  # 被隔离的输入：（文件名, 错误）
+        self._lock = threading.Lock()
+        self._ingest_lock = threading.Lock()
+        self._order_ids = set(df.index)
+        # 快照：（数据表, 筛选位图索引, 立方体, 日期汇总, 追加版本号），整体替换保证读到的是一致的一组
+        self.snapshot = (df, SalesFilterIndex(df), build_sales_cube(df), build_rollups(df), 0)
+
+    @property
+    def version(self):
+        return self.snapshot[-1]
+
+    def snapshot_key(self, version):
+        """某个快照在缓存key里的标识：（实例ID, 追加版本号）"""
+        return (self.store_id, version)
+
+    @property
+    def nbytes(self):
+        df, filter_index, cube, rollups, _ = self.snapshot
+        tables = [cube] + list(rollups.values())
+        return (int(df.memory_usage(deep=True).sum()) + filter_index.nbytes
+                + sum(int(t.memory_usage().sum()) for t in tables))
+
+    def append(self, new_orders):
+        """按订单号去重后追加；返回实际新增的行数"""
+        with self._lock:
+            df, filter_index, cube, rollups, version = self.snapshot
+            orders = conform_orders(new_orders, df)
+            orders = orders[~orders.index.duplicated(keep="last")]
+            orders = orders[[order_id not in self._order_ids for order_id in orders.index]]
+            if orders.empty:
+                return 0
+
+            self.snapshot = (
+                _concat_with_categories(df, orders),
+                filter_index.appended(orders),
+                merge_cubes(cube, build_sales_cube(orders)),
+                merge_rollups(rollups, build_rollups(orders)),
+                version + 1,
+            )
+            self._order_ids.update(orders.index)
+            return len(orders)
+
+    def replay_history(self, inbox_dir):
+        """重放投递目录里已处理过的订单；返回新增行数。追加时就出错的来源（已隔离）跳过"""
+        with self._ingest_lock:
+            added = 0
+            for orders in collect_history(inbox_dir):
+                try:
+                    added += self.append(orders)
+                except Exception:
+                    continue
+            return added
+
+    def ingest_inbox(self, inbox_dir):
+        """读取投递目录/队列文件中的新订单并追加；返回（新增行数, 本次被隔离的[(文件名, 错误)]）。
+        按来源文件逐个追加：某个文件的内容无法追加时只隔离该文件，其余订单照常写入"""
+        with self._ingest_lock:  # 同一进程内只让一个会话处理投递目录
+            batches, failed, commit = collect_inbox(inbox_dir)
+            added = 0
+            for path, orders in batches:
+                try:
+                    added += self.append(orders)
+                except Exception as e:
+                    if path is None:
+                        quarantine(inbox_dir, lines=orders.to_json(orient="records", lines=True,
+                                                                  force_ascii=False).splitlines())
+                        failed.append((QUEUE_FILE_NAME, str(e)))
+                    else:
+                        quarantine(inbox_dir, path)
+                        failed.append((os.path.basename(path), str(e)))
+            commit()
+            self.rejected.extend(failed)
+            return added, failed
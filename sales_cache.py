@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 列式缓存层
+首次读取Excel后将处理好的数据写成Arrow文件，之后按源文件的mtime+哈希校验，
+命中时直接内存映射读取，失效时回退到Excel解析并重建缓存
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from sales_schema import optimize_dtypes
+
+# ============================ 缓存配置 ============================
+SHEET_NAME = '销售数据'
+CACHE_DIR_NAME = '.sales_cache'   # 缓存目录（与Excel同目录）
+CACHE_VERSION = 3                 # 处理逻辑变化时递增，旧缓存自动失效
+
+
+def read_sales_excel(excel_path):
+    """解析销售Excel（跳过首行标题，以订单号为索引），并派生小时数列"""
+    df = pd.read_excel(
+        excel_path,
+        sheet_name=SHEET_NAME,
+        skiprows=1,
+        index_col='订单号',
+        engine='openpyxl'  # 指定引擎，避免Excel读取警告
+    )
+    return add_hour_column(df)
+
+
+def add_hour_column(df):
+    """提取交易小时数（新增列）；时间列可以是字符串或datetime.time"""
+    df['小时数'] = pd.to_datetime(df["时间"].astype(str), format="%H:%M:%S").dt.hour
+    return df
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """分块计算文件哈希，避免一次读入大文件"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path):
+    """文件指纹（绝对路径, mtime, 大小），作为进程级共享缓存的key"""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def _cache_paths(excel_path):
+    """返回（缓存数据文件, 元信息文件）路径"""
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(excel_path)), CACHE_DIR_NAME)
+    base = os.path.splitext(os.path.basename(excel_path))[0]
+    return os.path.join(cache_dir, f"{base}.arrow"), os.path.join(cache_dir, f"{base}.json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+
+
+def is_cache_fresh(excel_path):
+    """判断缓存是否仍然有效；mtime和大小未变直接命中，mtime变了再比对哈希"""
+    data_path, meta_path = _cache_paths(excel_path)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get('version') != CACHE_VERSION or not os.path.exists(data_path):
+        return False
+
+    stat = os.stat(excel_path)
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True
+    if meta.get('size') != stat.st_size:
+        return False
+
+    # 文件被touch/复制但内容未变：哈希一致则刷新mtime后继续复用
+    if meta.get('sha256') != file_sha256(excel_path):
+        return False
+    meta['mtime_ns'] = stat.st_mtime_ns
+    try:
+        _write_meta(meta_path, meta)
+    except OSError:
+        pass
+    return True
+
+
+def write_cache(excel_path, df, dtype_report=None):
+    """将DataFrame写成无压缩Arrow IPC文件（可内存映射），并记录源文件指纹和列类型报告"""
+    data_path, meta_path = _cache_paths(excel_path)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    stat = os.stat(excel_path)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    tmp_path = data_path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, data_path)  # 原子替换，避免并发读到半个文件
+
+    _write_meta(meta_path, {
+        'version': CACHE_VERSION,
+        'source': os.path.basename(excel_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': file_sha256(excel_path),
+        'rows': len(df),
+        'dtype_report': None if dtype_report is None else dtype_report.reset_index(names='列名').to_dict('records'),
+    })
+
+
+def read_cache(excel_path):
+    """内存映射读取Arrow缓存，还原为带订单号索引的DataFrame"""
+    data_path, _ = _cache_paths(excel_path)
+    with pa.memory_map(data_path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def load_sales_frame(excel_path):
+    """优先读取列式缓存；缓存缺失或过期时解析Excel并重建缓存"""
+    if not os.path.exists(excel_path):
+        raise FileNotFoundError(excel_path)
+
+    if is_cache_fresh(excel_path):
+        try:
+            return read_cache(excel_path)
+        except (OSError, pa.ArrowException):
+            pass  # 缓存损坏，回退到Excel解析
+
+    # 解析后先压缩列类型（category/uint8/float32），缓存里直接保存紧凑格式
+    df, dtype_report = optimize_dtypes(read_sales_excel(excel_path))
+    try:
+        write_cache(excel_path, df, dtype_report)
+    except OSError:
+        pass  # 目录只读等情况下不影响正常使用
+    return df
+
+
+def read_dtype_report(excel_path):
+    """读取最近一次建缓存时的列类型压缩报告（每列节省的字节数），没有则返回None"""
+    _, meta_path = _cache_paths(excel_path)
+    meta = _read_meta(meta_path)
+    if not meta or not meta.get('dtype_report'):
+        return None
+    return pd.DataFrame(meta['dtype_report']).set_index('列名')
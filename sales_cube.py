@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 预聚合数据立方体
+加载时按（城市, 顾客类型, 性别, 产品类型, 小时数）预先汇总销售额、笔数和评分，
+任意筛选组合只需汇总立方体单元格，耗时取决于维度组合数而不是交易笔数
+"""
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ["城市", "顾客类型", "性别", "产品类型", "小时数"]
+
+
+def build_sales_cube(df):
+    """按维度组合预聚合：销售额总和/非空笔数、评分总和/非空笔数、交易行数"""
+    # 压缩后的float32列转回float64再累加，避免大表求和损失精度
+    keys = [df[col] for col in CUBE_DIMENSIONS]
+    values = df[["总价", "评分"]].astype("float64")
+    grouped = values.groupby(keys, observed=True, dropna=False, sort=False)
+    cube = pd.DataFrame({
+        "sales_sum": grouped["总价"].sum(),
+        "sales_count": grouped["总价"].count(),
+        "rating_sum": grouped["评分"].sum(),
+        "rating_count": grouped["评分"].count(),
+        "rows": grouped.size(),
+    })
+    return cube.reset_index()
+
+
+def merge_cubes(cube, other):
+    """合并两个立方体（如已有立方体 + 新数据块的立方体），同一单元格的各项累加"""
+    merged = pd.concat([cube, other], ignore_index=True)
+    return merged.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False).sum().reset_index()
+
+
+def slice_cube(cube, selections):
+    """selections: {维度: 选中取值列表}；返回满足筛选条件的立方体单元格"""
+    mask = np.ones(len(cube), dtype=bool)
+    for col, selected in selections.items():
+        mask &= cube[col].isin(selected).to_numpy()
+    return cube[mask]
+
+
+def sales_by_hour(cube_slice):
+    """按小时数汇总销售额，等价于df.groupby("小时数")["总价"].sum()"""
+    return cube_slice.groupby("小时数", observed=True)["sales_sum"].sum().rename("总价")
+
+
+def sales_by_product_line(cube_slice):
+    """按产品类型汇总销售额并升序排列，等价于原始明细上的groupby+sort_values"""
+    result = cube_slice.groupby("产品类型", observed=True)["sales_sum"].sum().sort_values()
+    return result.rename("总价")
+
+
+def cube_kpis(cube_slice):
+    """核心指标：总销售额、平均评分、单笔平均销售额、交易笔数"""
+    sales_sum = cube_slice["sales_sum"].sum()
+    sales_count = cube_slice["sales_count"].sum()
+    rating_count = cube_slice["rating_count"].sum()
+    return {
+        "total_sales": sales_sum,
+        "average_rating": cube_slice["rating_sum"].sum() / rating_count if rating_count else np.nan,
+        "avg_per_trans": sales_sum / sales_count if sales_count else np.nan,
+        "rows": int(cube_slice["rows"].sum()),
+    }
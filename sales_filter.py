@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 筛选位图索引
+加载时为每个分类列的每个取值预先生成压缩位图（np.packbits），
+侧边栏筛选时只需对缓存的位图做按位或/与，不再经过df.query的表达式解析
+"""
+
+import numpy as np
+
+# 参与筛选的分类列（城市、顾客类型、性别、产品类型）
+FILTER_COLUMNS = ["城市", "顾客类型", "性别", "产品类型"]
+
+
+class SalesFilterIndex:
+    """分类列位图索引：{列名: {取值: 压缩位图}}"""
+
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.n_rows = len(df)
+        self.bitmaps = {}
+        self.uniques = {}
+        self.complete = {}  # 该列无缺失值时，全选等价于不筛选
+        for col in columns:
+            if col not in df.columns:
+                continue
+            # factorize一次得到每行的取值编号（缺失值为-1），再按编号生成各取值的位图
+            codes, uniques = df[col].factorize(sort=False)
+            self.uniques[col] = list(uniques)
+            self.complete[col] = bool((codes >= 0).all())
+            self.bitmaps[col] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(uniques)
+            }
+
+    @property
+    def nbytes(self):
+        """全部位图占用的字节数（供共享缓存估算容量）"""
+        return sum(bits.nbytes for col_maps in self.bitmaps.values() for bits in col_maps.values())
+
+    def values(self, col):
+        """返回某列的全部取值（按首次出现顺序，与Series.unique一致）"""
+        return self.uniques.get(col, [])
+
+    def column_bitmap(self, col, selected):
+        """某列选中取值的并集位图；全选时返回None表示该列不参与筛选"""
+        col_maps = self.bitmaps[col]
+        selected = {v for v in selected if v in col_maps}
+        if len(selected) == len(col_maps) and self.complete[col]:
+            return None
+        n_bytes = (self.n_rows + 7) // 8
+        bits = np.zeros(n_bytes, dtype=np.uint8)
+        for value in selected:
+            # 追加行后位图缓冲区可能预留了多余容量，只取前n_bytes
+            np.bitwise_or(bits, col_maps[value][:n_bytes], out=bits)
+        return bits
+
+    def appended(self, new_df):
+        """返回追加new_df各行后的新索引，只处理新增行。
+        位图缓冲区按倍数扩容并与原索引共享，新行只写入原n_rows之后的位，
+        原索引对象（其他会话可能正在用）的筛选结果不受影响；须始终在最新索引上追加"""
+        n_new = len(new_df)
+        total = self.n_rows + n_new
+        need = (total + 7) // 8
+        start_byte, offset = divmod(self.n_rows, 8)
+
+        result = object.__new__(SalesFilterIndex)
+        result.n_rows = total
+        result.bitmaps, result.uniques, result.complete = {}, {}, {}
+        for col, col_maps in self.bitmaps.items():
+            codes, uniques = new_df[col].factorize(sort=False)
+            code_of = {value: code for code, value in enumerate(uniques)}
+            result.uniques[col] = self.uniques[col] + [v for v in uniques if v not in col_maps]
+            result.complete[col] = self.complete[col] and bool((codes >= 0).all())
+            result.bitmaps[col] = {}
+            for value in result.uniques[col]:
+                buf = col_maps.get(value)
+                if buf is None:
+                    buf = np.zeros(need, dtype=np.uint8)
+                elif len(buf) < need:
+                    grown = np.zeros(max(need, 2 * len(buf)), dtype=np.uint8)
+                    grown[:len(buf)] = buf
+                    buf = grown
+                code = code_of.get(value)
+                hits = codes == code if code is not None else np.zeros(n_new, dtype=bool)
+                # 最后一个不满8位的字节先解包，与新行的位拼接后重新打包写回
+                head = np.unpackbits(buf[start_byte:start_byte + 1], count=offset).astype(bool)
+                tail = np.packbits(np.concatenate([head, hits]))
+                buf[start_byte:start_byte + len(tail)] = tail
+                result.bitmaps[col][value] = buf
+        return result
+
+    def mask(self, selections):
+        """selections: {列名: 选中取值列表}；返回布尔掩码，全部全选时返回None"""
+        result = None
+        for col, selected in selections.items():
+            bits = self.column_bitmap(col, selected)
+            if bits is None:
+                continue
+            if result is None:
+                result = bits
+            else:
+                np.bitwise_and(result, bits, out=result)
+        if result is None:
+            return None
+        return np.unpackbits(result, count=self.n_rows).view(bool)
+
+    def select(self, df, selections):
+        """按筛选条件返回子表，结果与df.query的多条件isin筛选一致"""
+        row_mask = self.mask(selections)
+        if row_mask is None:
+            return df
+        return df[row_mask]
+
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 服务端降采样与分页
+发给浏览器的数据量与筛选行数无关：条形图限制柱子数量，折线/散点图用LTTB或固定分桶降采样，
+原始数据表在服务端分页，每次只下发一页
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+MAX_BARS = 30           # 条形图最多柱子数，其余合并为“其他”
+MAX_POINTS = 2000       # 折线/散点图最多点数
+DEFAULT_PAGE_SIZE = 100
+OTHER_LABEL = "其他"
+
+
+def cap_bars(series, max_bars=MAX_BARS, other_label=OTHER_LABEL):
+    """分类条形图：超过max_bars时保留数值最大的若干项，其余求和合并为一根柱子"""
+    if len(series) <= max_bars:
+        return series
+    ordered = series.sort_values(ascending=False)
+    head = ordered.iloc[:max_bars - 1]
+    rest = pd.Series([ordered.iloc[max_bars - 1:].sum()], index=[other_label], name=series.name)
+    # 保留项维持原有顺序（如产品类型按销售额升序），“其他”追加在末尾
+    return pd.concat([series[series.index.isin(head.index)], rest]).rename_axis(series.index.name)
+
+
+def bucket_series(series, max_bars=MAX_BARS, agg="sum"):
+    """数值型索引（如小时、日期序号）的条形图：按固定宽度分桶聚合，桶标签取区间起点"""
+    if len(series) <= max_bars:
+        return series
+    index = np.asarray(series.index, dtype="float64")
+    edges = np.linspace(index.min(), index.max(), max_bars + 1)
+    bins = np.clip(np.searchsorted(edges, index, side="right") - 1, 0, max_bars - 1)
+    grouped = series.groupby(bins).agg(agg)
+    grouped.index = edges[grouped.index]
+    grouped.index.name = series.index.name
+    return grouped
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """Largest-Triangle-Three-Buckets降采样，返回保留点的下标（保持曲线形状）"""
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # 中间n_out-2个桶
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的平均点（最后一个桶用终点）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        if next_start >= next_end:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # 三角形面积（省略常数1/2）最大的点
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area)) if len(area) else start
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_frame(df, x, y, max_points=MAX_POINTS, method="lttb"):
+    """折线/散点图数据降采样：按x排序后用LTTB（保形）或固定分桶均值，返回不超过max_points行"""
+    if len(df) <= max_points:
+        return df
+    ordered = df.sort_values(x)
+    if method == "lttb":
+        x_values = ordered[x]
+        if not pd.api.types.is_numeric_dtype(x_values):
+            x_values = pd.to_datetime(x_values).astype("int64")
+        return ordered.iloc[lttb(x_values, ordered[y], max_points)]
+    positions = np.arange(len(ordered)) * max_points // len(ordered)
+    return ordered.groupby(positions).agg({x: "first", y: "mean"})
+
+
+def page_count(n_rows, page_size=DEFAULT_PAGE_SIZE):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def paginate(df, page, page_size=DEFAULT_PAGE_SIZE):
+    """服务端分页：page从1开始，越界时夹到合法范围；只切出这一页下发"""
+    page = min(max(1, int(page)), page_count(len(df), page_size))
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 按日期的时间序列汇总
+加载时按（期间, 城市, 产品类型）预先生成日/周/月三级汇总，
+日期区间查询、趋势图和同比视图都只读汇总表，不再扫描明细
+"""
+
+import pandas as pd
+
+ROLLUP_DIMENSIONS = ["城市", "产品类型"]
+GRAINS = {"日": "D", "周": "W-SUN", "月": "M"}  # 周从周一开始
+MEASURES = ["sales_sum", "sales_count", "rating_sum", "rating_count", "rows"]
+
+
+def _period_start(dates, freq):
+    if freq == "D":
+        return dates.dt.normalize()
+    return dates.dt.to_period(freq).dt.start_time
+
+
+def build_daily_rollup(df):
+    """按（日期, 城市, 产品类型）汇总；度量与立方体一致，便于求平均值"""
+    dates = pd.to_datetime(df["日期"]).dt.normalize().rename("期间")
+    keys = [dates] + [df[col] for col in ROLLUP_DIMENSIONS]
+    values = df[["总价", "评分"]].astype("float64")
+    grouped = values.groupby(keys, observed=True, dropna=False, sort=True)
+    daily = pd.DataFrame({
+        "sales_sum": grouped["总价"].sum(),
+        "sales_count": grouped["总价"].count(),
+        "rating_sum": grouped["评分"].sum(),
+        "rating_count": grouped["评分"].count(),
+        "rows": grouped.size(),
+    })
+    return daily.reset_index()
+
+
+def _regroup(daily, freq):
+    periods = _period_start(daily["期间"], freq)
+    keys = [periods] + [daily[col] for col in ROLLUP_DIMENSIONS]
+    return daily[MEASURES].groupby(keys, observed=True, dropna=False, sort=True).sum().reset_index()
+
+
+def build_rollups(df):
+    """返回{粒度: 汇总表}；周、月由日汇总再聚合，只扫描一次明细"""
+    daily = build_daily_rollup(df)
+    return {grain: daily if freq == "D" else _regroup(daily, freq) for grain, freq in GRAINS.items()}
+
+
+def merge_rollups(rollups, other):
+    """合并两组汇总（如已有汇总 + 新增订单的汇总），同一期间同一组合的度量累加"""
+    merged = {}
+    for grain in GRAINS:
+        combined = pd.concat([rollups[grain], other[grain]], ignore_index=True)
+        keys = ["期间"] + ROLLUP_DIMENSIONS
+        merged[grain] = combined.groupby(keys, observed=True, dropna=False, sort=True)[MEASURES].sum().reset_index()
+    return merged
+
+
+def date_bounds(rollups):
+    """汇总覆盖的（最早日期, 最晚日期）"""
+    daily = rollups["日"]["期间"]
+    return daily.min(), daily.max()
+
+
+def query_trend(rollups, grain, start=None, end=None, selections=None):
+    """按粒度返回日期区间内每个期间的销售额、笔数和平均评分；selections只支持城市/产品类型"""
+    table = rollups[grain]
+    mask = pd.Series(True, index=table.index)
+    if start is not None:
+        # 期间以起始日标记：周/月只要与区间有交集就计入
+        mask &= table["期间"] >= _period_start(pd.Series([pd.Timestamp(start)]), GRAINS[grain]).iloc[0]
+    if end is not None:
+        mask &= table["期间"] <= pd.Timestamp(end)
+    for col, selected in (selections or {}).items():
+        if col in ROLLUP_DIMENSIONS:
+            mask &= table[col].isin(selected)
+    trend = table[mask].groupby("期间")[MEASURES].sum()
+    trend["平均评分"] = trend["rating_sum"] / trend["rating_count"]
+    return trend.rename(columns={"sales_sum": "销售额", "rows": "交易笔数"})[["销售额", "交易笔数", "平均评分"]]
+
+
+def year_over_year(rollups, selections=None):
+    """同比视图：行=月份(1-12)，列=年份，值=当月销售额；直接由月汇总得出"""
+    monthly = query_trend(rollups, "月", selections=selections)
+    table = pd.DataFrame({
+        "年份": monthly.index.year,
+        "月份": monthly.index.month,
+        "销售额": monthly["销售额"].to_numpy(),
+    })
+    return table.pivot(index="月份", columns="年份", values="销售额")
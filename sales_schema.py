@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 紧凑列类型
+按列类型约定把文本分类列转为category、小时数转为uint8、总价保持float64，
+其它浮点列在不损失精度（保留到分）时降为float32，并统计每列节省的字节数
+"""
+
+import numpy as np
+import pandas as pd
+
+# 列类型约定：未列出的列按通用规则处理（整数向下转型、浮点按精度检查降级）
+SALES_SCHEMA = {
+    "城市": "category",
+    "顾客类型": "category",
+    "性别": "category",
+    "产品类型": "category",
+    "时间": "category",
+    "小时数": "uint8",
+    # 总价要被整列求和：单行误差虽不到半分，float32（约7位有效数字）在几十万元量级累加后总额会差出几分
+    "总价": "float64",
+}
+FLOAT32_TOLERANCE = 0.005  # 金额精确到分，float32往返误差不超过半分才降级
+
+
+def _can_use_float32(values):
+    values = values.to_numpy(dtype="float64", na_value=np.nan)
+    roundtrip = values.astype("float32").astype("float64")
+    finite = np.isfinite(values)
+    return bool(np.all(np.abs(roundtrip[finite] - values[finite]) <= FLOAT32_TOLERANCE))
+
+
+def optimize_dtypes(df, schema=SALES_SCHEMA):
+    """返回（压缩后的DataFrame, 每列内存报告）；报告按节省字节数降序"""
+    before = df.memory_usage(deep=True, index=False)
+    result = df.copy()
+    for col in result.columns:
+        series = result[col]
+        target = schema.get(col)
+        if target == "category":
+            result[col] = series.astype("category")
+        elif target is not None:
+            if not series.isna().any():  # 含缺失值的整数列无法转为uint8，保持原类型
+                result[col] = series.astype(target)
+        elif pd.api.types.is_integer_dtype(series):
+            unsigned = series.min() >= 0 if len(series) else True
+            result[col] = pd.to_numeric(series, downcast="unsigned" if unsigned else "integer")
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            if _can_use_float32(series):
+                result[col] = series.astype("float32")
+    after = result.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        "原类型": df.dtypes.astype(str),
+        "新类型": result.dtypes.astype(str),
+        "原字节数": before,
+        "新字节数": after,
+    })
+    report["节省字节数"] = report["原字节数"] - report["新字节数"]
+    return result, report.sort_values("节省字节数", ascending=False)
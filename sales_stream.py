@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+超市销售数据 - 流式分块读取
+逐个读取多个分区文件（CSV/Parquet/XLSX），每次只处理一个数据块，
+并把数据块折叠进预聚合立方体；全程不拼接完整明细，峰值内存只与块大小有关
+"""
+
+import glob
+import os
+
+import pandas as pd
+
+from sales_cache import SHEET_NAME, add_hour_column
+from sales_cube import CUBE_DIMENSIONS, build_sales_cube, merge_cubes
+
+DEFAULT_CHUNK_ROWS = 100_000
+PARTITION_PATTERNS = ("*.csv", "*.parquet", "*.xlsx")
+# 汇总只需要的列：读分区时按列裁剪，减少每块的内存
+NEEDED_COLUMNS = [c for c in CUBE_DIMENSIONS if c != "小时数"] + ["时间", "总价", "评分"]
+
+
+def list_partitions(source):
+    """source可以是单个文件、目录或文件列表；目录下按文件名排序返回全部分区"""
+    if isinstance(source, (list, tuple)):
+        return list(source)
+    if os.path.isdir(source):
+        paths = []
+        for pattern in PARTITION_PATTERNS:
+            paths.extend(glob.glob(os.path.join(source, pattern)))
+        return sorted(paths)
+    return [source]
+
+
+def iter_csv_chunks(path, chunk_rows, encoding="utf-8"):
+    yield from pd.read_csv(path, usecols=NEEDED_COLUMNS, chunksize=chunk_rows, encoding=encoding)
+
+
+def iter_parquet_chunks(path, chunk_rows):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=NEEDED_COLUMNS):
+        yield batch.to_pandas()
+
+
+def iter_xlsx_chunks(path, chunk_rows):
+    """openpyxl只读模式逐行读取；与原工作簿格式一致（首行标题，第二行表头）"""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.worksheets[0]
+        rows = ws.iter_rows(min_row=2, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keep = [i for i, name in enumerate(header) if name in NEEDED_COLUMNS]
+        columns = [header[i] for i in keep]
+        buffer = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            buffer.append([row[i] for i in keep])
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+def iter_sales_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS, encoding="utf-8"):
+    """按分区、按块依次产出数据块（已派生小时数列）"""
+    for path in list_partitions(source):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".csv":
+            chunks = iter_csv_chunks(path, chunk_rows, encoding)
+        elif ext == ".parquet":
+            chunks = iter_parquet_chunks(path, chunk_rows)
+        elif ext in (".xlsx", ".xlsm"):
+            chunks = iter_xlsx_chunks(path, chunk_rows)
+        else:
+            raise ValueError(f"不支持的分区文件类型：{path}")
+        for chunk in chunks:
+            yield add_hour_column(chunk)
+
+
+class StreamingSalesAggregator:
+    """把数据块逐个折叠进立方体；立方体大小只与维度组合数有关"""
+
+    def __init__(self):
+        self.cube = None
+        self.chunks = 0
+        self.rows = 0
+
+    def add(self, chunk):
+        chunk_cube = build_sales_cube(chunk)
+        if self.cube is None:
+            self.cube = chunk_cube
+        else:
+            self.cube = merge_cubes(self.cube, chunk_cube)
+        self.chunks += 1
+        self.rows += len(chunk)
+        return self
+
+
+def stream_sales_cube(source, chunk_rows=DEFAULT_CHUNK_ROWS, encoding="utf-8", progress=None):
+    """流式读取全部分区并返回立方体；progress(已处理块数, 已处理行数)用于进度展示"""
+    aggregator = StreamingSalesAggregator()
+    for chunk in iter_sales_chunks(source, chunk_rows, encoding):
+        aggregator.add(chunk)
+        if progress is not None:
+            progress(aggregator.chunks, aggregator.rows)
+    if aggregator.cube is None:
+        return build_sales_cube(pd.DataFrame(columns=NEEDED_COLUMNS + ["小时数"]))
+    return aggregator.cube
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+进程级共享缓存
+Streamlit每次重跑都会重新执行页面脚本，但被import的模块在进程内只加载一次，
+因此放在这里的缓存可被所有浏览器会话共享：同一份数据只保留一个不可变副本。
+按字节数限制容量（LRU淘汰）+ TTL过期，并统计命中/未命中次数
+"""
+
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import TTLCache
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 默认最多缓存512MB
+DEFAULT_TTL_SECONDS = 600               # 默认10分钟过期
+
+
+def estimate_nbytes(value):
+    """估算缓存对象占用的字节数，用于按容量淘汰"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(v) for v in value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, (int, np.integer)):
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class SharedCache:
+    """线程安全的LRU+TTL缓存；同一个key并发未命中时只计算一次"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=self._entry_size)
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(entry):
+        # 单个对象超过容量时cachetools会拒绝写入，这里至少按1字节计
+        return max(entry[1], 1)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        entry = (value, estimate_nbytes(value))
+        with self._lock:
+            expected = len(self._cache) + (0 if key in self._cache else 1)
+            try:
+                self._cache[key] = entry
+            except ValueError:
+                return value  # 对象本身超过缓存容量，不缓存直接返回
+            self.evictions += max(expected - len(self._cache), 0)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """命中直接返回；未命中时持有该key的锁计算，避免多个会话重复加载"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+        try:
+            with self._key_lock(key):
+                with self._lock:
+                    entry = self._cache.get(key)
+                    if entry is not None:  # 等锁期间已被其他会话算好
+                        self.hits += 1
+                        return entry[0]
+                    self.misses += 1
+                value = compute()
+                self.set(key, value)
+        finally:
+            # compute()抛异常（包括st.stop()）时也要释放该key的锁，否则会一直留在_key_locks里
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """命中/未命中/淘汰次数、当前条目数与占用字节数"""
+        with self._lock:
+            self._cache.expire()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+            }
+
+
+# 销售仪表板共用的进程级缓存（数据表、筛选索引、立方体、筛选结果）
+SALES_CACHE = SharedCache()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+结果表导出（各应用的批量页面共用）
+把预测结果DataFrame转成可直接交给st.download_button的文件内容：CSV分块写出、带BOM，Parquet整表写出
+"""
+
+import io
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def to_download_bytes(result, file_format="csv", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """结果转成可下载的文件内容；CSV分块写出，带BOM便于Excel直接打开中文"""
+    buffer = io.BytesIO()
+    if file_format == "parquet":
+        result.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    text = io.TextIOWrapper(buffer, encoding="utf-8-sig", newline="")
+    for start in range(0, len(result), chunk_rows):
+        result.iloc[start:start + chunk_rows].to_csv(text, index=False, header=(start == 0))
+    if len(result) == 0:
+        result.to_csv(text, index=False)
+    text.flush()
+    data = buffer.getvalue()
+    text.detach()
+    return data
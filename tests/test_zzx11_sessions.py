@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+zzx11.py预测页的多会话测试
+同一进程里同时打开多个AppTest会话（各自独立的st.session_state，共享导入的模块、模型和图片缓存），
+每个会话提交一只不同物种的企鹅；所有会话都运行过之后，再逐个重跑，检查每个会话的
+st.session_state["penguin_prediction"]和页面上显示的结果仍是它自己的
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+import penguin_model  # noqa: E402
+from penguin_data import load_penguin_dataset  # noqa: E402
+from penguin_images import IMAGE_FILES  # noqa: E402
+
+PREDICTION_KEY = "penguin_prediction"
+ISLANDS = ["比斯科群岛", "德里姆岛", "托尔森岛"]
+SEXES = ["雌性", "雄性"]
+# 表单数值控件：（控件标签, 数据集列名, 下限, 上限），与zzx11.py的number_input一致
+NUMBER_INPUTS = [
+    ("喙长度（mm）", "喙长度(mm)", 32.0, 60.0),
+    ("喙深度（mm）", "喙深度(mm)", 13.0, 22.0),
+    ("翅膀长度（mm）", "鳍长(mm)", 170.0, 240.0),
+    ("体重（g）", "体重(g)", 2700.0, 6300.0),
+]
+
+
+@pytest.fixture(scope="module")
+def penguins(tmp_path_factory):
+    """每个物种各取一只表单能输入、且模型能正确识别的企鹅：[(物种, 表单输入), ...]。
+    在临时目录里运行（zzx11.py和penguin_model都使用相对路径）：训练出的模型和导出的工件不会写进仓库"""
+    if not os.path.exists(os.path.join(ROOT, penguin_model.DATA_PATH)):
+        pytest.skip(f"缺少数据集：{penguin_model.DATA_PATH}")
+    workdir = tmp_path_factory.mktemp("zzx11")
+    for name in [penguin_model.DATA_PATH, *(path for paths in IMAGE_FILES.values() for path in paths)]:
+        if os.path.exists(os.path.join(ROOT, name)):
+            shutil.copy(os.path.join(ROOT, name), workdir / name)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(workdir)
+        status = penguin_model.warm_up()  # 先训练/导出模型，会话里只剩内存映射
+        assert status["state"] == "ready", status.get("error")
+        model, species_map = penguin_model.load_flat_model()
+
+        picks = {}
+        for record in load_penguin_dataset(penguin_model.DATA_PATH).df.to_dict("records"):
+            if record["岛屿"] not in ISLANDS or record["性别"] not in SEXES or record["物种"] in picks:
+                continue
+            inputs = (record["岛屿"], record["性别"],
+                      *(min(max(float(record[col]), low), high) for _, col, low, high in NUMBER_INPUTS))
+            if penguin_model.predict_species(model, species_map, *inputs)["species"] == record["物种"]:
+                picks[record["物种"]] = inputs
+        if len(picks) < 2:
+            pytest.skip("数据集中可区分的物种不足两个")
+        yield list(picks.items())
+
+
+def _by_label(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def open_session():
+    """打开一个新会话并切换到预测页"""
+    at = AppTest.from_file(os.path.join(ROOT, "zzx11.py"), default_timeout=120)
+    at.run()
+    at.sidebar.selectbox[0].select("物种预测").run()
+    assert not at.exception
+    return at
+
+
+def submit(at, inputs):
+    island, sex, *numbers = inputs
+    _by_label(at.selectbox, "栖息岛屿").select(island)
+    _by_label(at.selectbox, "性别").select(sex)
+    for (label, _, _, _), value in zip(NUMBER_INPUTS, numbers):
+        _by_label(at.number_input, label).set_value(value)
+    _by_label(at.button, "预测").click().run()
+
+
+def assert_shows(at, species):
+    assert not at.exception
+    assert at.session_state[PREDICTION_KEY]["species"] == species
+    assert [s.value for s in at.success if "预测结果" in s.value] == [f"🎉 预测结果：{species}"]
+
+
+def test_sessions_keep_their_own_prediction(penguins):
+    sessions = [(species, inputs, open_session()) for species, inputs in penguins]
+
+    for species, inputs, at in sessions:
+        submit(at, inputs)
+        assert_shows(at, species)
+
+    # 其它会话都提交过之后，每个会话重跑仍显示自己的结果（倒序再核对一遍，排除顺序巧合）
+    for species, _, at in sessions + sessions[::-1]:
+        at.run()
+        assert_shows(at, species)
+
+
+def test_resubmitting_one_session_leaves_others_untouched(penguins):
+    (first_species, first_inputs), (second_species, second_inputs) = penguins[:2]
+    first, second = open_session(), open_session()
+    submit(first, first_inputs)
+    submit(second, second_inputs)
+
+    # 第一个会话改提交第二种企鹅，第二个会话不受影响；反过来也一样
+    submit(first, second_inputs)
+    second.run()
+    assert_shows(first, second_species)
+    assert_shows(second, second_species)
+
+    submit(second, first_inputs)
+    first.run()
+    assert_shows(second, first_species)
+    assert_shows(first, second_species)
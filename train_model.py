@@ -1,59 +1,255 @@
+"""
+医疗费用模型训练（命令行）
+- 随机森林用n_jobs并行训练（默认使用全部CPU核）
+- warm_start分批增加树的数量，每一批训练完都写检查点，中断后重新运行会从检查点继续
+- 记录每个阶段的墙钟时间、CPU时间和峰值内存，输出训练报告（JSON）
+
+用法：
+    python train_model.py                                  # 默认：insurance.csv，100棵树，每批10棵
+    python train_model.py --n-estimators 500 --step 50 --n-jobs 8
+    python train_model.py --fresh                          # 忽略已有检查点，从头训练
+    python train_model.py --n-estimators 50 --max-depth 10 --max-features 0.5   # 用hparam_search.py推荐的参数
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
-import pickle
+from forest_artifact import save_forest_artifact
+from forest_flat import compile_forest, max_abs_diff
+from insurance_batch import read_insured_file
+from insurance_encoder import TARGET, InsuranceEncoder, normalize_columns
+from process_stats import peak_rss_mb
+
+CHECKPOINT_FILE = 'rfr_checkpoint.pkl'
+
+
+class StageTimer:
+    """按阶段记录墙钟时间、CPU时间（含所有线程）和阶段结束时的进程峰值内存"""
+
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, func, *args, **kwargs):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        self.stages.append({
+            "stage": name,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "cpu_utilization": round(cpu / wall, 2) if wall > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        peak = self.stages[-1]["peak_rss_mb"]
+        print(f"[{name}] 墙钟 {wall:.2f}s，CPU {cpu:.2f}s" + (f"，峰值内存 {peak:.1f}MB" if peak is not None else ""))
+        return result
+
 
 # ====================== 1. 加载并查看数据 ======================
-# 确保insurance.csv和此文件在同一目录（D:\streamlit_env\）
-data = pd.read_csv('insurance.csv')
-# 查看数据集结构（可选，用于确认字段）
-print("数据集字段：", data.columns.tolist())
-print("数据集前5行：")
-print(data.head())
-
-# 特征（X）：age, sex, bmi, children, smoker, region
-# 目标（y）：charges（医疗费用）
-X = data[['age', 'sex', 'bmi', 'children', 'smoker', 'region']]
-y = data['charges']
-
-# ====================== 2. 手动对分类特征做独热编码（和前端对齐） ======================
-# 分类特征：sex（男性/女性）、smoker（是/否）、region（东南部/西南部/东北部/西北部）
-# 步骤：将分类特征转换为独热编码（和前端代码的编码逻辑完全一致）
-
-# 2.1 性别独热编码（sex_female, sex_male）
-X = pd.get_dummies(X, columns=['sex'], prefix='sex', drop_first=False)
-# 2.2 吸烟状态独热编码（smoker_yes, smoker_no）
-X = pd.get_dummies(X, columns=['smoker'], prefix='smoker', drop_first=False)
-# 2.3 区域独热编码（region_东南部, region_西南部, region_东北部, region_西北部）
-# 注意：数据集里的region是英文（southeast/southwest/northeast/northwest），需和前端中文对应
-# 先将数据集的英文region替换为中文（和前端一致）
-X['region'] = X['region'].map({
-    'southeast': '东南部',
-    'southwest': '西南部',
-    'northeast': '东北部',
-    'northwest': '西北部'
-})
-X = pd.get_dummies(X, columns=['region'], prefix='region', drop_first=False)
-
-# 查看编码后的特征（关键！记录特征名和顺序）
-print("\n编码后的特征名：", X.columns.tolist())
-print("编码后的特征数量：", len(X.columns.tolist()))
-
-# ====================== 3. 拆分训练集和测试集 ======================
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# ====================== 4. 训练随机森林模型 ======================
-rfr_model = RandomForestRegressor(n_estimators=100, random_state=42)
-rfr_model.fit(X_train, y_train)
-
-# ====================== 5. 保存模型和特征名（关键！前端需要用） ======================
-# 保存模型
-with open('rfr_model.pkl', 'wb') as f:
-    pickle.dump(rfr_model, f)
-
-# 保存特征名（后续前端代码直接用这个列表）
-with open('feature_names.pkl', 'wb') as f:
-    pickle.dump(X.columns.tolist(), f)
-
-print("\n模型和特征名已保存！")
-print("最终特征名列表：", X.columns.tolist())
+def load_data(data_path):
+    # 确保insurance.csv和此文件在同一目录（D:\streamlit_env\）
+    data = read_insured_file(data_path)  # utf-8读取失败时按gbk（中文数据集是gbk编码）
+    # 查看数据集结构（可选，用于确认字段）
+    print("数据集字段：", data.columns.tolist())
+    print("数据集前5行：")
+    print(data.head())
+    return data
+
+
+# ====================== 2. 特征编码（和前端共用同一个编码器） ======================
+def encode_features(data):
+    # 特征（X）：age, sex, bmi, children, smoker, region
+    # 目标（y）：charges（医疗费用）
+    # InsuranceEncoder把英文取值（female/yes/southeast...）统一映射为前端使用的中文取值，
+    # 列顺序固定为 数值特征 + sex/smoker/region的独热列；中文表头的数据也可以直接训练
+    encoder = InsuranceEncoder().fit(data)
+    X, invalid = encoder.transform(data)
+    y = pd.to_numeric(normalize_columns(data)[TARGET], errors='coerce').to_numpy()
+    valid = ~invalid & ~np.isnan(y)
+    if not valid.all():
+        print(f"跳过 {int((~valid).sum())} 行缺失或取值无法识别的数据")
+    X = pd.DataFrame(X[valid], columns=encoder.feature_names)
+    y = pd.Series(y[valid], name=TARGET)
+
+    # 查看编码后的特征（关键！记录特征名和顺序）
+    print("\n编码后的特征名：", encoder.feature_names)
+    print("编码后的特征数量：", encoder.n_features)
+    return X, y, encoder
+
+
+# ====================== 4. 分批训练（可断点续训） ======================
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_checkpoint(checkpoint_path, model, config):
+    """先写临时文件再原子替换，训练中途被杀也不会留下半个检查点"""
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'model': model, 'config': config, 'n_done': len(model.estimators_)}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path, config):
+    """读取检查点；训练配置（数据哈希、随机种子等）不一致时视为无效"""
+    if not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        print(f"检查点无法读取（{e}），从头训练")
+        return None
+    if state.get('config') != config:
+        print("检查点的训练配置与本次不一致，从头训练")
+        return None
+    return state['model']
+
+
+def parse_max_features(value):
+    """--max-features 支持 sqrt/log2、小数（比例）和整数（个数），与sklearn的取值一致"""
+    if value in (None, 'sqrt', 'log2'):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() and number > 1 else number
+
+
+def fit_incrementally(X_train, y_train, config, n_estimators, step, n_jobs, checkpoint_path, timer):
+    """warm_start每次增加step棵树，训练完一批立即写检查点。
+    整数random_state下每棵树的随机种子与一次性训练相同，续训结果与一次训练完全一致；
+    树的总数、每批树数和并行线程数都不影响已训练的树，不计入config：续训时可以加大树数、换核数"""
+    model = load_checkpoint(checkpoint_path, config) if checkpoint_path else None
+    if model is not None and len(model.estimators_) > n_estimators:
+        print(f"检查点已有 {len(model.estimators_)} 棵树，多于本次目标 {n_estimators}，从头训练")
+        model = None
+    if model is not None:
+        print(f"从检查点继续：已完成 {len(model.estimators_)}/{n_estimators} 棵树")
+        model.set_params(n_jobs=n_jobs)
+    else:
+        model = RandomForestRegressor(
+            n_estimators=0,
+            max_depth=config['max_depth'],
+            max_features=config['max_features'],
+            random_state=config['random_state'],
+            n_jobs=n_jobs,
+            warm_start=True
+        )
+
+    done = len(getattr(model, 'estimators_', []))
+    while done < n_estimators:
+        target = min(done + step, n_estimators)
+        model.set_params(n_estimators=target)
+        timer.run(f"fit_{done}_{target}", model.fit, X_train, y_train)
+        done = target
+        if checkpoint_path:
+            timer.run(f"checkpoint_{done}", save_checkpoint, checkpoint_path, model, config)
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="训练医疗费用随机森林模型（并行、可断点续训）")
+    parser.add_argument('--data', default='insurance.csv', help="训练数据CSV（英文或中文表头均可）")
+    parser.add_argument('--n-estimators', type=int, default=100, help="树的总数")
+    parser.add_argument('--step', type=int, default=10, help="每批增加的树数（每批写一次检查点）")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="并行线程数，-1表示全部CPU核")
+    parser.add_argument('--max-depth', type=int, default=None, help="树的最大深度（默认不限制）")
+    parser.add_argument('--max-features', type=parse_max_features, default=1.0,
+                        help="每次分裂考虑的特征：sqrt/log2、比例或个数（可用hparam_search.py搜索）")
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help="检查点目录，传空字符串关闭检查点")
+    parser.add_argument('--report', default='training_report.json', help="训练报告输出路径")
+    parser.add_argument('--fresh', action='store_true', help="忽略已有检查点，从头训练")
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+    data = timer.run("load", load_data, args.data)
+    X, y, encoder = timer.run("encode", encode_features, data)
+
+    # ====================== 3. 拆分训练集和测试集 ======================
+    X_train, X_test, y_train, y_test = timer.run(
+        "split", train_test_split, X, y, test_size=0.2, random_state=args.random_state)
+
+    config = {
+        'data_sha256': file_sha256(args.data),
+        'features': encoder.feature_names,
+        'max_depth': args.max_depth,
+        'max_features': args.max_features,
+        'random_state': args.random_state,
+    }
+    checkpoint_path = None
+    if args.checkpoint_dir:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+        checkpoint_path = os.path.join(args.checkpoint_dir, CHECKPOINT_FILE)
+        if args.fresh and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    # ====================== 4. 训练随机森林模型 ======================
+    rfr_model = fit_incrementally(X_train, y_train, config, args.n_estimators, args.step, args.n_jobs,
+                                  checkpoint_path, timer)
+
+    test_r2 = timer.run("evaluate", rfr_model.score, X_test, y_test)
+    print(f"\n测试集R²：{test_r2:.4f}")
+
+    # ====================== 4.1 校验扁平化推理引擎（前端用它代替sklearn的predict） ======================
+    flat_model = compile_forest(rfr_model)
+    print("\n扁平化推理引擎与sklearn预测的最大差值：", max_abs_diff(rfr_model, flat_model, X_test))
+
+    # ====================== 5. 保存模型和特征名（关键！前端需要用） ======================
+    def save_outputs():
+        # 保存前恢复为普通模型：前端单行预测不需要多线程，也不应该继续warm_start
+        rfr_model.set_params(warm_start=False, n_jobs=None)
+        # 保存模型（和zzx10一样存(模型, 特征名)，前端可以直接加载）
+        with open('rfr_model.pkl', 'wb') as f:
+            pickle.dump((rfr_model, encoder.feature_names), f)
+        # 保存特征名（特征名即可还原编码器）
+        with open('feature_names.pkl', 'wb') as f:
+            pickle.dump(encoder.feature_names, f)
+        # 前端预测用的内存映射工件，编码器一并写入manifest
+        save_forest_artifact('rfr_model.forest', flat_model, feature_names=encoder.feature_names,
+                             categories=encoder.categories, encoder=encoder.to_dict(),
+                             source_files=['rfr_model.pkl', 'feature_names.pkl'])
+
+    timer.run("save", save_outputs)
+    print("\n模型和特征名已保存！")
+    print("最终特征名列表：", encoder.feature_names)
+
+    report = {
+        "data": args.data,
+        "rows": len(data),
+        "n_estimators": args.n_estimators,
+        "step": args.step,
+        "max_depth": args.max_depth,
+        "max_features": args.max_features,
+        "n_jobs": args.n_jobs,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "test_r2": round(float(test_r2), 6),
+        "total_wall_s": round(time.perf_counter() - wall_start, 4),
+        "total_cpu_s": round(time.process_time() - cpu_start, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timer.stages,
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"训练报告已写入：{args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
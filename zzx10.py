@@ -1,10 +1,17 @@
 import streamlit as st
+import altair as alt
 import pickle
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder
 import os
+import time
+from insurance_batch import read_insured_file, score_insured, sensitivity_sweep
+from table_export import to_download_bytes
+from insurance_encoder import DEFAULT_CATEGORIES, InsuranceEncoder
+from model_registry import MODEL_REGISTRY
+from forest_artifact import load_or_export, manifest_path
+from prediction_cache import get_prediction_cache, find_prediction_cache
 
 # ===================== 全局配置 =====================
 st.set_page_config(
@@ -35,21 +42,11 @@ def add_custom_css():
 # ===================== 核心修复：统一模型训练和特征处理 =====================
 def train_and_save_model():
     """训练并保存模型，确保特征名和顺序完全一致"""
-    # 1. 定义固定的特征配置（全局统一）
-    numerical_features = ['age', 'bmi', 'children']
-    categorical_features = {
-        'sex': ['女性', '男性'],
-        'smoker': ['否', '是'],
-        'region': ['东南部', '西南部', '东北部', '西北部']
-    }
+    # 1. 固定的特征配置（与train_model.py、前端共用同一个编码器，特征名和顺序由编码器决定）
+    encoder = InsuranceEncoder(DEFAULT_CATEGORIES)
+    feature_names = encoder.feature_names
     
-    # 2. 生成完整的特征名列表（固定顺序）
-    feature_names = numerical_features.copy()
-    for cat, values in categorical_features.items():
-        for val in values:
-            feature_names.append(f"{cat}_{val}")
-    
-    # 3. 创建并训练模型
+    # 2. 创建并训练模型
     # 生成模拟训练数据（匹配特征）
     np.random.seed(42)
     n_samples = 100
@@ -64,19 +61,10 @@ def train_and_save_model():
     smoker = np.random.choice(['否', '是'], n_samples, p=[0.8, 0.2])
     region = np.random.choice(['东南部', '西南部', '东北部', '西北部'], n_samples)
     
-    # 构建特征矩阵
-    X_numerical = np.column_stack([age, bmi, children])
-    
-    # 独热编码分类特征
-    ohe = OneHotEncoder(sparse_output=False, categories=[
-        categorical_features['sex'],
-        categorical_features['smoker'],
-        categorical_features['region']
-    ])
-    X_categorical = ohe.fit_transform(np.column_stack([sex, smoker, region]))
-    
-    # 合并特征
-    X = np.hstack([X_numerical, X_categorical])
+    # 一次向量化编码为特征矩阵
+    X, _ = encoder.transform(pd.DataFrame({
+        'age': age, 'sex': sex, 'bmi': bmi, 'children': children, 'smoker': smoker, 'region': region
+    }))
     
     # 生成目标变量（模拟医疗费用）
     y = (
@@ -92,7 +80,7 @@ def train_and_save_model():
     model = RandomForestRegressor(n_estimators=50, random_state=42)
     model.fit(X, y)
     
-    # 4. 保存模型和特征名
+    # 3. 保存模型和特征名（特征名即可还原编码器）
     with open('rfr_model.pkl', 'wb') as f:
         pickle.dump((model, feature_names), f)  # 同时保存模型和特征名
     
@@ -101,29 +89,77 @@ def train_and_save_model():
     
     return feature_names
 
+MODEL_FILE = 'rfr_model.pkl'
+FEATURE_FILE = 'feature_names.pkl'
+REGISTRY_NAME = 'insurance_rfr'
+# 前端预测用的紧凑工件（.npy数组 + manifest.json，内存映射加载），由rfr_model.pkl自动导出
+ARTIFACT_DIR = 'rfr_model.forest'
+# 预测缓存：BMI按0.1分桶（与表单步长一致），容量可按需调整
+PREDICTION_CACHE_SIZE = 4096
+PREDICTION_BUCKETS = {'bmi': 0.1}
+SWEEP_LABELS = {'age': '年龄', 'bmi': 'BMI指数', 'children': '子女数量'}
+
+def get_insurance_prediction_cache(feature_names):
+    """进程内唯一的预测结果缓存，模型文件变化时自动清空"""
+    return get_prediction_cache(
+        REGISTRY_NAME,
+        model_files=[MODEL_FILE, FEATURE_FILE, manifest_path(ARTIFACT_DIR)],
+        maxsize=PREDICTION_CACHE_SIZE,
+        feature_names=feature_names,
+        buckets=PREDICTION_BUCKETS
+    )
+
 # 加载模型和特征名（统一加载逻辑）
 def load_model_and_features():
-    """统一加载模型和特征名，确保匹配"""
+    """进程内只反序列化一次模型和特征名（模型文件变化时自动重新加载），所有会话共用"""
+    return MODEL_REGISTRY.get(REGISTRY_NAME, load_model_and_features_from_disk, files=[MODEL_FILE, FEATURE_FILE])
+
+def load_flat_model():
+    """扁平化推理引擎（与sklearn结果一致，单行预测开销更小）：内存映射rfr_model.forest工件，
+    不反序列化pickle；工件缺失或比rfr_model.pkl旧时先从pickle导出。
+    返回（FlatForest, InsuranceEncoder），编码器与模型保存在同一个工件里"""
+    return MODEL_REGISTRY.get(
+        REGISTRY_NAME + '_flat',
+        load_flat_model_from_artifact,
+        files=[MODEL_FILE, FEATURE_FILE, manifest_path(ARTIFACT_DIR)]
+    )
+
+def load_flat_model_from_artifact():
+    flat_model, manifest = load_or_export(ARTIFACT_DIR, [MODEL_FILE, FEATURE_FILE], export_artifact_source)
+    if manifest.get('encoder'):
+        encoder = InsuranceEncoder.from_dict(manifest['encoder'])
+    else:
+        encoder = InsuranceEncoder.from_feature_names(flat_model.feature_names)
+    return flat_model, encoder
+
+def export_artifact_source():
+    """导出工件的来源：pickle里的模型，加上由特征名还原的编码器"""
+    model, feature_names = load_model_and_features()
+    encoder = InsuranceEncoder.from_feature_names(feature_names)
+    return model, {'feature_names': feature_names, 'categories': encoder.categories, 'encoder': encoder.to_dict()}
+
+def load_model_and_features_from_disk():
+    """统一加载模型和特征名，确保匹配（特征名一致性只在加载时校验一次）"""
     try:
         # 检查文件是否存在
-        if not os.path.exists('rfr_model.pkl') or not os.path.exists('feature_names.pkl'):
+        if not os.path.exists(MODEL_FILE) or not os.path.exists(FEATURE_FILE):
             st.info("⚠️ 模型文件缺失，正在自动训练模型...")
             feature_names = train_and_save_model()
             st.success("✅ 模型训练完成！")
         
         # 加载特征名
-        with open('feature_names.pkl', 'rb') as f:
+        with open(FEATURE_FILE, 'rb') as f:
             feature_names = pickle.load(f)
         
         # 加载模型（包含特征名验证）
-        with open('rfr_model.pkl', 'rb') as f:
+        with open(MODEL_FILE, 'rb') as f:
             model, model_feature_names = pickle.load(f)
         
         # 验证特征名匹配
         if feature_names != model_feature_names:
             st.warning("⚠️ 特征名不匹配，重新训练模型...")
             feature_names = train_and_save_model()
-            with open('rfr_model.pkl', 'rb') as f:
+            with open(MODEL_FILE, 'rb') as f:
                 model, _ = pickle.load(f)
         
         return model, feature_names
@@ -132,7 +168,7 @@ def load_model_and_features():
         st.error(f"❌ 加载模型失败：{str(e)}")
         # 强制重新训练
         feature_names = train_and_save_model()
-        with open('rfr_model.pkl', 'rb') as f:
+        with open(MODEL_FILE, 'rb') as f:
             model, _ = pickle.load(f)
         return model, feature_names
 
@@ -189,8 +225,9 @@ def introduce_page():
 
 def predict_page():
     """预测页面 - 修复特征匹配问题"""
-    # 统一加载模型和特征名
-    model, feature_names = load_model_and_features()
+    # 预测走内存映射的扁平化推理引擎，编码器与模型存在同一个工件里
+    flat_model, encoder = load_flat_model()
+    feature_names = encoder.feature_names
     
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.title("💰 医疗费用预测")
@@ -212,6 +249,7 @@ def predict_page():
             smoke = st.radio("是否吸烟", ("否", "是"), horizontal=True)
             region = st.selectbox('常住区域', ('东南部', '西南部', '东北部', '西北部'))
         
+        show_sweep = st.checkbox("📈 同时做敏感性分析（年龄 / BMI / 子女数量 × 是否吸烟）", value=False)
         submitted = st.form_submit_button('🚀 预测费用', use_container_width=True)
         
         if submitted:
@@ -219,28 +257,11 @@ def predict_page():
             st.markdown("### 📊 预测结果")
             
             try:
-                # ========== 核心修复：严格按照模型训练时的特征顺序编码 ==========
-                # 1. 初始化特征值为0
-                feature_values = {name: 0.0 for name in feature_names}
-                
-                # 2. 赋值数值特征（严格匹配）
-                feature_values['age'] = float(age)
-                feature_values['bmi'] = float(bmi)
-                feature_values['children'] = float(children)
-                
-                # 3. 赋值分类特征（严格匹配训练时的顺序）
-                feature_values[f"sex_{sex}"] = 1.0
-                feature_values[f"smoker_{smoke}"] = 1.0
-                feature_values[f"region_{region}"] = 1.0
+                # ========== 与训练共用的编码器：按模型训练时的特征顺序直接写入(1, 特征数)矩阵 ==========
+                input_array = encoder.transform_row(age, sex, bmi, children, smoke, region)
                 
-                # 4. 严格按照特征名顺序提取值
-                input_features = [feature_values[name] for name in feature_names]
-                
-                # 5. 转换为数组（模型要求的格式）
-                input_array = np.array(input_features).reshape(1, -1)
-                
-                # 6. 预测（直接使用数组，避免DataFrame列名问题）
-                predict_result = model.predict(input_array)[0]
+                # 预测（直接使用数组，避免DataFrame列名问题）
+                predict_result = get_insurance_prediction_cache(feature_names).predict(flat_model, input_array)
                 
                 # ========== 展示结果 ==========
                 col_result1, col_result2 = st.columns([1, 2])
@@ -273,6 +294,9 @@ def predict_page():
                     else:
                         st.success("**低风险**：该被保险人医疗费用预测值较低，可按常规定价")
                 
+                if show_sweep:
+                    sensitivity_section(flat_model, encoder, age, sex, bmi, children, smoke, region)
+                
                 st.markdown("---")
                 st.markdown("📧 技术支持：support@example.com")
                 
@@ -280,7 +304,72 @@ def predict_page():
                 st.error(f"❌ 预测过程出错：{str(e)}")
                 st.write("🔍 调试信息：")
                 st.write(f"- 特征名列表：{feature_names}")
-                st.write(f"- 输入特征值：{input_features if 'input_features' in locals() else '无'}")
+                st.write(f"- 输入特征值：{input_array.tolist() if 'input_array' in locals() else '无'}")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def sensitivity_section(flat_model, encoder, age, sex, bmi, children, smoke, region):
+    """敏感性分析：围绕提交的画像生成全部变体，一次批量预测，画出各变量的响应曲线"""
+    st.markdown("### 📈 敏感性分析")
+    profile = {'age': age, 'sex': sex, 'bmi': bmi, 'children': children, 'smoker': smoke, 'region': region}
+    start = time.perf_counter()
+    curves = sensitivity_sweep(flat_model, encoder, profile)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    st.caption(f"共 {len(curves):,} 个变体，一次批量预测用时 {elapsed_ms:.1f} ms；虚线为当前输入")
+    
+    tabs = st.tabs([SWEEP_LABELS[v] for v in SWEEP_LABELS])
+    for tab, (variable, label) in zip(tabs, SWEEP_LABELS.items()):
+        data = curves[curves['变量'] == variable].rename(columns={'smoker': '是否吸烟'})
+        lines = alt.Chart(data).mark_line(point=variable == 'children').encode(
+            x=alt.X('取值:Q', title=label),
+            y=alt.Y('预测医疗费用:Q', title='预测医疗费用（元/年）'),
+            color=alt.Color('是否吸烟:N', scale=alt.Scale(domain=['否', '是'], range=['#3498db', '#e74c3c'])),
+            tooltip=[alt.Tooltip('取值:Q', title=label), '是否吸烟:N', alt.Tooltip('预测医疗费用:Q', format=',.2f')]
+        )
+        current = alt.Chart(pd.DataFrame({'取值': [profile[variable]]})).mark_rule(strokeDash=[4, 4], color='#7f8c8d').encode(x='取值:Q')
+        with tab:
+            st.altair_chart((lines + current).properties(height=320), use_container_width=True)
+
+def batch_predict_page():
+    """批量预测页面 - 上传整份名单，向量化编码后分块预测，结果可下载"""
+    flat_model, encoder = load_flat_model()
+    
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.title("📂 批量预测医疗费用")
+    st.markdown("#### 上传被保险人名单（CSV/Parquet），一次性预测全部人员的年度医疗费用")
+    st.caption("必需列：年龄、性别、BMI、子女数量、是否吸烟、区域（也支持 age/sex/bmi/children/smoker/region 英文表头）")
+    st.divider()
+    
+    uploaded = st.file_uploader("选择名单文件", type=["csv", "parquet"])
+    output_format = st.radio("结果文件格式", ["csv", "parquet"], horizontal=True)
+    
+    if uploaded is not None and st.button("🚀 开始批量预测", use_container_width=True):
+        try:
+            df = read_insured_file(uploaded)
+            progress_bar = st.progress(0.0, text="正在预测...")
+            start = time.perf_counter()
+            result = score_insured(
+                flat_model, encoder, df,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"已预测 {done:,}/{total:,} 人")
+            )
+            elapsed = time.perf_counter() - start
+            progress_bar.empty()
+            
+            n_invalid = int(result["预测医疗费用"].isna().sum())
+            st.success(f"✅ 完成 {len(result):,} 人的预测，用时 {elapsed:.2f} 秒")
+            if n_invalid:
+                st.warning(f"⚠️ {n_invalid} 行存在缺失或无法识别的取值，未给出预测")
+            st.dataframe(result.head(100), use_container_width=True)
+            
+            st.download_button(
+                "⬇️ 下载预测结果",
+                data=to_download_bytes(result, output_format),
+                file_name=f"医疗费用预测结果.{output_format}",
+                mime="text/csv" if output_format == "csv" else "application/octet-stream",
+                use_container_width=True
+            )
+        except Exception as e:
+            st.error(f"❌ 批量预测出错：{str(e)}")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -292,9 +381,9 @@ def main():
     st.sidebar.title("📋 导航菜单")
     nav = st.sidebar.radio(
         "", 
-        ["系统简介", "预测医疗费用"],
+        ["系统简介", "预测医疗费用", "批量预测"],
         index=0,
-        format_func=lambda x: f"📄 {x}" if x == "系统简介" else f"🔮 {x}"
+        format_func=lambda x: {"系统简介": "📄 ", "预测医疗费用": "🔮 ", "批量预测": "📂 "}[x] + x
     )
     
     st.sidebar.divider()
@@ -306,9 +395,23 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
+    # 模型加载指标（进程内首次加载后才有）
+    model_metrics = MODEL_REGISTRY.metrics(REGISTRY_NAME + '_flat')
+    if model_metrics:
+        st.sidebar.caption(
+            f"模型加载耗时 {model_metrics['load_ms']} ms，内存约 {model_metrics['size_mb']} MB，"
+            f"已复用 {model_metrics['hits']} 次"
+        )
+    prediction_cache = find_prediction_cache(REGISTRY_NAME)
+    if prediction_cache is not None:
+        cache_stats = prediction_cache.stats()
+        st.sidebar.caption(f"预测缓存命中率 {cache_stats['hit_rate']:.0%}（{cache_stats['entries']} 条）")
+    
     # 页面切换
     if nav == "系统简介":
         introduce_page()
+    elif nav == "批量预测":
+        batch_predict_page()
     else:
         predict_page()
 
@@ -5,36 +5,27 @@
 """
 
 import streamlit as st
-import pickle
-import pandas as pd
 import os
-from sklearn.ensemble import RandomForestClassifier
+import time
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
+from penguin_data import load_penguin_dataset
+import penguin_model
+from penguin_batch import DEFAULT_CHUNK_ROWS, classify_penguins, read_survey_file
+from table_export import to_download_bytes
+from penguin_model import DATA_PATH, SPECIES_IMG_MAP
+from penguin_images import BANNER_WIDTH, GALLERY_WIDTH, LOGO_WIDTH, get_image
 
 # ============================ 全局配置（全相对路径，无绝对路径依赖） ============================
 st.set_page_config(page_title="企鹅分类器", page_icon="🐧", layout="wide")
 
 # 核心修改：所有路径改为相对路径（代码文件与数据集/图片在同一目录）
-# 数据集相对路径：直接写文件名（因数据集在D:/streamlit_env，代码也在该目录）
-DATA_PATH = "(企鹅识别数据)penguins-chinese.csv"
-# 模型文件相对路径
-MODEL_PATH = "rfc_model.pkl"
-SPECIES_MAP_PATH = "output_uniques.pkl"
-# 物种图片相对路径（图片与代码在同一目录）
-SPECIES_IMG_MAP = {
-    "阿德利企鹅": "ADELIE.png",
-    "帽带企鹅": "CHINSTRAP.png",
-    "巴布亚企鹅": "GENTOO.png"
-}
-# Logo和合集图相对路径
-LOGO_IMG = "right_logo.png"
-PENGUINS_ALL_IMG = "penguins_all.png"
+# 数据集、模型文件的相对路径定义在penguin_model.py（与预热命令行共用）
+# 物种图片、Logo和全家福的相对路径定义在penguin_images.py（启动时缩放好放在内存里）
 
 # 数据中实际岛屿
 ACTUAL_ISLANDS = ["比斯科群岛", "德里姆岛", "托尔森岛"]
-predict_result_species = None
-predict_result_img = None
+# 预测结果保存在每个浏览器会话自己的st.session_state里（同一进程的多个用户互不覆盖）
+PREDICTION_KEY = "penguin_prediction"
 
 # ============================ 工具函数（适配相对路径） ============================
 def check_file_exists(file_path, file_type="文件"):
@@ -57,97 +48,64 @@ def check_species_images():
             st.write(f"- {img}")
     return missing
 
-def get_correct_image(species_name):
-    """获取物种图片（相对路径）"""
+def get_correct_image(species_name, img_bytes=None):
+    """获取物种图片（相对路径）；img_bytes为预测时已取到的图片字节"""
     if species_name not in SPECIES_IMG_MAP:
         default_img = f"https://picsum.photos/300/300?{species_name}"
         return default_img, f"未识别物种：{species_name}（用默认图替代）"
     
     img_path = SPECIES_IMG_MAP[species_name]
-    if os.path.exists(img_path):
-        return img_path, f"成功加载{species_name}图片（相对路径）"
+    if img_bytes is None:
+        img_bytes = penguin_model.load_species_image(species_name)  # 启动预热时已缩放好放在内存里
+    if img_bytes is not None:
+        return img_bytes, f"成功加载{species_name}图片（相对路径）"
     else:
         default_img = f"https://picsum.photos/300/300?{species_name}"
         return default_img, f"缺失{species_name}图片：{img_path}（用默认图替代）"
 
 # ============================ 核心功能函数（适配相对路径） ============================
-def load_and_preprocess_data():
-    """加载数据集（相对路径）"""
-    global ACTUAL_ISLANDS
+def load_penguin_data(show_errors=True):
+    """数据集（按文件指纹在进程内缓存，所有会话、两个页面共用）；文件缺失或读取失败时返回None"""
+    if not show_errors:
+        try:
+            return load_penguin_dataset(DATA_PATH) if os.path.exists(DATA_PATH) else None
+        except Exception:
+            return None
     # 先检查数据集是否存在（相对路径）
     if not check_file_exists(DATA_PATH, "数据集"):
-        return None, None, None
-    
-    # 读取数据集（gbk编码）
+        return None
     try:
-        df = pd.read_csv(DATA_PATH, encoding="gbk")
-        st.success(f"✅ 成功读取数据集（相对路径：{DATA_PATH}）")
+        return load_penguin_dataset(DATA_PATH)
     except Exception as e:
         st.error(f"❌ 读取数据集失败：{str(e)}")
-        return None, None, None
-    
-    # 数据清洗
-    df = df.dropna(subset=["企鹅的种类", "企鹅栖息的岛屿", "喙的长度", "喙的深度", "翅膀的长度", "身体质量", "性别"])
-    df = df.reset_index(drop=True)
-    
-    # 同步岛屿名称
-    data_islands = df["企鹅栖息的岛屿"].unique()
-    if not set(data_islands).issubset(set(ACTUAL_ISLANDS)):
-        ACTUAL_ISLANDS = list(data_islands)
-        st.info(f"ℹ️ 数据集包含岛屿：{ACTUAL_ISLANDS}")
-    
-    # 列名映射
-    df.rename(columns={
-        "企鹅的种类": "物种",
-        "企鹅栖息的岛屿": "岛屿",
-        "喙的长度": "喙长度(mm)",
-        "喙的深度": "喙深度(mm)",
-        "翅膀的长度": "鳍长(mm)",
-        "身体质量": "体重(g)"
-    }, inplace=True)
-    
-    # 特征编码
-    X = pd.get_dummies(df[["喙长度(mm)", "喙深度(mm)", "鳍长(mm)", "体重(g)", "岛屿", "性别"]], 
-                      columns=["岛屿", "性别"], drop_first=False)
-    le = LabelEncoder()
-    y = le.fit_transform(df["物种"])
-    species_map = {idx: name for idx, name in enumerate(le.classes_)}
-    
-    return X, y, species_map
+        return None
 
-def train_or_load_model():
-    """加载/训练模型（相对路径）"""
-    # 先检查模型文件是否存在（相对路径）
-    model_exists = os.path.exists(MODEL_PATH) and os.path.exists(SPECIES_MAP_PATH)
-    if model_exists:
-        try:
-            with open(MODEL_PATH, "rb") as f:
-                model = pickle.load(f)
-            with open(SPECIES_MAP_PATH, "rb") as f:
-                species_map = pickle.load(f)
-            st.success(f"✅ 加载预训练模型（相对路径：{MODEL_PATH}）")
-            return model, species_map
-        except Exception as e:
-            st.warning(f"⚠️ 加载模型失败：{str(e)}，将重新训练")
-    
-    # 重新训练模型
-    X, y, species_map = load_and_preprocess_data()
-    if X is None:
-        return None, None
-    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    model.fit(X, y)
-    
-    # 保存模型（相对路径）
-    with open(MODEL_PATH, "wb") as f:
-        pickle.dump(model, f)
-    with open(SPECIES_MAP_PATH, "wb") as f:
-        pickle.dump(species_map, f)
-    st.success(f"✅ 模型训练完成并保存（相对路径：{MODEL_PATH}）")
-    return model, species_map
+def get_islands(dataset=None):
+    """岛屿选项：数据中出现了预设之外的岛屿时以数据为准"""
+    if dataset is None or set(dataset.islands).issubset(set(ACTUAL_ISLANDS)):
+        return ACTUAL_ISLANDS
+    return dataset.islands
+
+def st_log(level, message):
+    """把penguin_model的日志显示为Streamlit提示"""
+    getattr(st, level)(message)
+
+def load_flat_model():
+    """扁平化推理引擎（内存映射工件，启动预热后直接命中）。返回（FlatForest, 物种映射），失败时返回(None, None)"""
+    return penguin_model.load_flat_model(log=st_log)
+
+def show_readiness():
+    """侧边栏显示本进程模型的预热状态"""
+    status = penguin_model.readiness()
+    if status["state"] == "ready":
+        st.sidebar.caption(f"🟢 模型已就绪（加载 {status['model_ms']} ms，图片 {status['images_ms']} ms）")
+    elif status["state"] == "failed":
+        st.sidebar.caption(f"🔴 模型预热失败：{status.get('error')}")
+    else:
+        st.sidebar.caption("🟡 模型预热中...")
 
 # ============================ 页面逻辑（适配相对路径） ============================
 def render_predict_page():
-    global predict_result_species, predict_result_img
     st.header("企鹅物种预测 📊")
     
     # 检查图片是否存在（相对路径）
@@ -158,7 +116,7 @@ def render_predict_page():
     with col_form:
         # 输入表单
         with st.form("predict_form"):
-            island = st.selectbox("栖息岛屿", ACTUAL_ISLANDS)
+            island = st.selectbox("栖息岛屿", get_islands(load_penguin_data(show_errors=False)))
             sex = st.selectbox("性别", ["雌性", "雄性"])
             bill_length = st.number_input("喙长度（mm）", 32.0, 60.0, 45.0)
             bill_depth = st.number_input("喙深度（mm）", 13.0, 22.0, 17.0)
@@ -167,70 +125,109 @@ def render_predict_page():
             submit = st.form_submit_button("预测", type="primary")
         
         # 加载模型并预测
-        model, species_map = train_or_load_model()
+        model, species_map = load_flat_model()
         if submit and model:
-            # 构造输入特征
-            input_data = {
-                "喙长度(mm)": bill_length,
-                "喙深度(mm)": bill_depth,
-                "鳍长(mm)": flipper_length,
-                "体重(g)": body_mass
-            }
-            # 补充分类特征one-hot编码
-            for feat in model.feature_names_in_:
-                if feat.startswith("岛屿_"):
-                    input_data[feat] = 1 if feat == f"岛屿_{island}" else 0
-                elif feat.startswith("性别_"):
-                    input_data[feat] = 1 if feat == f"性别_{sex}" else 0
-            
-            # 执行预测
-            input_df = pd.DataFrame([[input_data[f] for f in model.feature_names_in_]], 
-                                   columns=model.feature_names_in_)
-            predict_code = model.predict(input_df)[0]
-            predict_result_species = species_map[predict_code]
-            predict_result_img, img_msg = get_correct_image(predict_result_species)
-            
+            # 执行预测（编码和推理都不碰共享状态），结果只写入本会话
+            result = penguin_model.predict_species(
+                model, species_map, island, sex, bill_length, bill_depth, flipper_length, body_mass
+            )
+            result["image"], result["message"] = get_correct_image(result["species"], result["image"])
+            st.session_state[PREDICTION_KEY] = result
+        
+        # 本会话最近一次的预测结果（切换页面后回来仍然保留）
+        prediction = st.session_state.get(PREDICTION_KEY)
+        if prediction:
             # 显示结果
-            st.success(f"🎉 预测结果：{predict_result_species}")
-            st.info(f"🖼️ {img_msg}")
+            st.success(f"🎉 预测结果：{prediction['species']}")
+            st.info(f"🖼️ {prediction['message']}")
 
     # 显示图片（相对路径）
     with col_logo:
-        if not submit or not predict_result_img:
-            # 未预测时显示Logo（相对路径）
-            if os.path.exists(LOGO_IMG):
-                st.image(LOGO_IMG, width=300, caption="企鹅分类器（相对路径图片）")
+        if not prediction or not prediction["image"]:
+            # 未预测时显示Logo（已缩放的内存图片）
+            logo_img = get_image("logo", LOGO_WIDTH)
+            if logo_img is not None:
+                st.image(logo_img, width=LOGO_WIDTH, caption="企鹅分类器（相对路径图片）")
             else:
                 st.image("https://picsum.photos/300/300?penguinlogo", width=300, caption="企鹅分类器（默认图）")
         else:
             # 预测后显示物种图片（相对路径）
-            st.image(predict_result_img, width=300, caption=f"预测物种：{predict_result_species}")
+            st.image(prediction["image"], width=300, caption=f"预测物种：{prediction['species']}")
+
+def render_batch_page():
+    """批量识别：上传调查表，分块计算三个物种的概率，显示每批吞吐量，结果可下载"""
+    st.header("企鹅物种批量识别 📂")
+    st.caption("必需列：岛屿、性别、喙长度(mm)、喙深度(mm)、鳍长(mm)、体重(g)"
+               "（也支持数据集原始表头和 island/sex/bill_length_mm 等英文表头）")
+    
+    uploaded = st.file_uploader("选择调查表（CSV）", type=["csv"])
+    chunk_rows = st.number_input("每批行数", min_value=1_000, max_value=200_000, value=DEFAULT_CHUNK_ROWS, step=1_000)
+    output_format = st.radio("结果文件格式", ["csv", "parquet"], horizontal=True)
+    model, species_map = load_flat_model()
+    if uploaded is None or model is None or not st.button("开始识别", type="primary"):
+        return
+    
+    try:
+        df = read_survey_file(uploaded)
+        progress_bar = st.progress(0.0, text="正在识别...")
+        start = time.perf_counter()
+        result, batches = classify_penguins(
+            model, species_map, df, chunk_rows=int(chunk_rows),
+            progress=lambda done, total: progress_bar.progress(done / total, text=f"已识别 {done:,}/{total:,} 只")
+        )
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        progress_bar.empty()
+    except Exception as e:
+        st.error(f"❌ 批量识别出错：{str(e)}")
+        return
+    
+    n_invalid = int(result["预测物种"].isna().sum())
+    st.success(f"✅ 完成 {len(result):,} 只企鹅的识别，用时 {elapsed:.2f} 秒（约 {len(result) / elapsed:,.0f} 只/秒）")
+    if n_invalid:
+        st.warning(f"⚠️ {n_invalid} 行存在缺失或无法识别的取值，未给出结果")
+    
+    col_count, col_batches = st.columns([1, 2])
+    with col_count:
+        st.write("**各物种数量**")
+        st.dataframe(result["预测物种"].value_counts().rename_axis("物种").reset_index(name="数量"), hide_index=True)
+    with col_batches:
+        st.write("**每批吞吐量**")
+        st.dataframe(batches, hide_index=True, use_container_width=True)
+    st.dataframe(result.head(100), use_container_width=True)
+    
+    st.download_button(
+        "⬇️ 下载识别结果",
+        data=to_download_bytes(result, output_format),
+        file_name=f"企鹅识别结果.{output_format}",
+        mime="text/csv" if output_format == "csv" else "application/octet-stream"
+    )
 
 def render_intro_page():
     st.header("企鹅分类器 🐧")
     st.subheader("数据集简介（相对路径版）")
     
     # 数据集基本信息（相对路径）
+    dataset = load_penguin_data()
     st.write(f"- 数据集相对路径：{DATA_PATH}")
     st.write(f"- 代码与数据集位置要求：必须在同一目录（如D:/streamlit_env）")
-    st.write(f"- 包含岛屿：{', '.join(ACTUAL_ISLANDS)}")
+    st.write(f"- 包含岛屿：{', '.join(get_islands(dataset))}")
     st.write("- 预测物种：阿德利企鹅、帽带企鹅、巴布亚企鹅")
     
-    # 显示数据集样本（相对路径）
-    if check_file_exists(DATA_PATH, "数据集"):
-        try:
-            df_sample = pd.read_csv(DATA_PATH, encoding="gbk").head(5)
-            st.dataframe(df_sample, use_container_width=True)
-        except:
-            st.warning("⚠️ 无法加载数据集样本")
+    # 显示数据集样本（来自缓存，不再重新读取CSV）
+    if dataset is not None:
+        st.dataframe(dataset.raw.head(5), use_container_width=True)
     
-    # 物种图鉴（相对路径）
+    # 物种图鉴（已缩放的内存图片）
     st.subheader("物种图鉴（相对路径图片）")
+    banner_img = get_image("全家福", BANNER_WIDTH)
+    if banner_img is not None:
+        st.image(banner_img, width=BANNER_WIDTH)
     col1, col2, col3 = st.columns(3)
-    for (species, img_path), col in zip(SPECIES_IMG_MAP.items(), [col1, col2, col3]):
+    for species, col in zip(SPECIES_IMG_MAP, [col1, col2, col3]):
         with col:
-            if os.path.exists(img_path):
-                st.image(img_path, use_container_width=True)
+            img_bytes = get_image(species, GALLERY_WIDTH)
+            if img_bytes is not None:
+                st.image(img_bytes, use_container_width=True)
                 st.caption(f"{species}（相对路径）")
             else:
                 st.image(f"https://picsum.photos/200/200?{species}", use_container_width=True)
@@ -238,6 +235,9 @@ def render_intro_page():
 
 # ============================ 主程序 ============================
 if __name__ == "__main__":
+    # 本进程首次运行时在后台预热模型和图片（只启动一次；部署时先运行 python penguin_model.py 预热）
+    penguin_model.start_background_warmup()
+    
     # 初始化检查：代码与数据集是否在同一目录
     st.markdown("### 📌 初始化检查（相对路径版）")
     if check_file_exists(DATA_PATH, "数据集"):
@@ -247,11 +247,14 @@ if __name__ == "__main__":
     
     # 渲染侧边栏
     st.sidebar.title("功能导航")
-    page = st.sidebar.selectbox("选择页面", ["数据集简介", "物种预测"], label_visibility="collapsed")
+    page = st.sidebar.selectbox("选择页面", ["数据集简介", "物种预测", "批量识别"], label_visibility="collapsed")
+    show_readiness()
     
     # 渲染对应页面
     if page == "数据集简介":
         render_intro_page()
+    elif page == "批量识别":
+        render_batch_page()
     else:
         render_predict_page()
     
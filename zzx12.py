@@ -5,6 +5,9 @@ import joblib
 import os
 from PIL import Image
 from sklearn.ensemble import RandomForestRegressor
+from forest_artifact import load_or_export, manifest_path
+from model_registry import MODEL_REGISTRY
+from prediction_cache import get_prediction_cache
 
 # ====================== 全局配置（白色主题适配） ======================
 st.set_page_config(
@@ -40,6 +43,8 @@ st.markdown("""
 # 定义文件路径（已匹配当前目录）
 FILE_PATH = "学生数据表.xlsx"
 MODEL_PATH = "model.pkl"
+ARTIFACT_DIR = "model.forest"  # 预测用紧凑工件（.npy + manifest.json，内存映射），由model.pkl自动导出
+REGISTRY_NAME = "grade_rfr_flat"
 CONGRATS_IMG_PATH = "congratulations.png"
 ENCOURAGE_IMG_PATH = "encouragement.png"
 PROJECT_INTRO_IMG_PATH = "project_intro.png"  # 已在当前目录的图片路径
@@ -60,8 +65,8 @@ def load_data():
     df = df.dropna()
     return df
 
-@st.cache_resource
 def train_and_load_model(df):
+    """只在导出工件时调用（工件缺失或比model.pkl旧），每次都从磁盘读取，保证导出的是当前的model.pkl"""
     if os.path.exists(MODEL_PATH):
         return joblib.load(MODEL_PATH)
     st.info("首次运行，正在训练预测模型...")
@@ -76,10 +81,31 @@ def train_and_load_model(df):
     st.success("模型训练完成！")
     return model
 
+def load_flat_model(df):
+    """扁平数组推理引擎（结果与sklearn一致，单行预测更快）：内存映射model.forest工件，
+    不再反序列化model.pkl；工件缺失或比model.pkl旧时先训练/加载模型并导出。
+    每个进程只加载一次，model.pkl或工件变化时重新加载（与预测缓存使用同一组文件签名）"""
+    forest, _ = MODEL_REGISTRY.get(
+        REGISTRY_NAME,
+        lambda: load_or_export(ARTIFACT_DIR, [MODEL_PATH], lambda: (train_and_load_model(df), {})),
+        files=[MODEL_PATH, manifest_path(ARTIFACT_DIR)]
+    )
+    return forest
+
+def get_grade_prediction_cache(feature_names):
+    """成绩预测结果缓存：出勤率、作业完成率按滑块步长0.01分桶，模型文件变化时自动清空"""
+    return get_prediction_cache(
+        "grade_rfr",
+        model_files=[MODEL_PATH, manifest_path(ARTIFACT_DIR)],
+        maxsize=2048,
+        feature_names=feature_names,
+        buckets={"上课出勤率": 0.01, "作业完成率": 0.01}
+    )
+
 # ====================== 加载资源 ======================
 df = load_data()
 if df is not None:
-    model = train_and_load_model(df)
+    flat_model = load_flat_model(df)
 
 # ====================== 侧边栏导航 ======================
 st.sidebar.title("导航菜单")
@@ -236,7 +262,7 @@ elif page == "成绩预测":
             "性别": [gender_enc], "专业": [major_enc], "每周学习时长（小时）": [study_hours],
             "上课出勤率": [attendance], "期中考试分数": [midterm_score], "作业完成率": [homework_rate]
         })
-        pred_score = model.predict(input_data)[0]
+        pred_score = get_grade_prediction_cache(list(input_data.columns)).predict(flat_model, input_data.to_numpy())
         
         st.subheader(f"预测期末成绩：{pred_score:.2f}分")
         if pred_score >= 60:
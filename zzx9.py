@@ -1,12 +1,26 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import os
 import sys
+from sales_cache import load_sales_frame, file_fingerprint
+from sales_filter import SalesFilterIndex
+from sales_append import LiveSalesStore
+import sales_cube
+import sales_rollup
+from sales_stream import stream_sales_cube, list_partitions
+from shared_cache import SALES_CACHE
+from sales_render import cap_bars, bucket_series, paginate, page_count, downsample_frame, DEFAULT_PAGE_SIZE
 
-def get_dataframe_from_excel():
-    """读取Excel销售数据，返回处理后的DataFrame（使用相对路径）"""
+# 侧边栏筛选控件的key（筛选列 → 控件key），立方体切片直接从session_state读取选择
+SIDEBAR_KEYS = {"城市": "city_select", "顾客类型": "customer_type_select", "性别": "gender_select"}
+# 设置该环境变量（分区目录或单个文件）后启用流式模式：分块汇总，不加载完整明细
+PARTITION_DIR_ENV = "SALES_PARTITION_DIR"
+# 新订单投递目录（放CSV/XLSX/JSON文件，或向其中的queue.jsonl逐行追加），可用环境变量覆盖
+INBOX_DIR = os.environ.get("SALES_INBOX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_inbox"))
+
+def get_excel_path():
+    """返回销售Excel的路径（使用相对路径），文件不存在时提示并停止"""
     # ========== 关键修改：相对路径配置 ==========
     # 获取当前脚本所在目录（确保无论在哪运行，都能找到同目录的Excel）
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,31 +32,91 @@ def get_dataframe_from_excel():
     if not os.path.exists(excel_path):
         st.error(f"未找到Excel文件！请确认文件 {excel_filename} 放在代码同目录下\n当前查找路径：{excel_path}")
         st.stop()  # 停止程序运行
+    return excel_path
+
+def get_dataframe_from_excel():
+    """读取Excel销售数据，返回处理后的DataFrame（使用相对路径）"""
+    excel_path = get_excel_path()
     
     try:
-        # 读取Excel数据（跳过首行标题，以订单号为索引）
-        df = pd.read_excel(
-            excel_path,
-            sheet_name='销售数据',
-            skiprows=1,
-            index_col='订单号',
-            engine='openpyxl'  # 指定引擎，避免Excel读取警告
-        )
-        
-        # 提取交易小时数（新增列）
-        df['小时数'] = pd.to_datetime(df["时间"], format="%H:%M:%S").dt.hour
+        # 优先读取列式缓存（已含小时数列），缓存过期时自动回退解析Excel
+        df = load_sales_frame(excel_path)
         return df
     except Exception as e:
         st.error(f"读取Excel失败：{str(e)}")
         st.stop()
 
-def add_sidebar_func(df):
-    """创建侧边栏筛选器，返回筛选后的数据"""
+def get_sales_data():
+    """数据表、筛选位图索引、预聚合立方体、日期汇总放在进程级共享缓存里，按文件指纹复用，所有会话共用一份；
+    投递目录里有新订单时只增量追加，返回的指纹带上实例ID和追加版本号，使筛选结果缓存自动失效"""
+    fingerprint = file_fingerprint(get_excel_path())
+    
+    def build_store():
+        store = LiveSalesStore(get_dataframe_from_excel())
+        store.replay_history(INBOX_DIR)  # 缓存过期重建时补回此前已追加的订单
+        return store
+    
+    store = SALES_CACHE.get_or_compute(("sales_store", fingerprint), build_store)
+    added, failed = store.ingest_inbox(INBOX_DIR)
+    if added:
+        st.toast(f"已追加 {added} 条新订单")
+    for name, error in failed:
+        st.toast(f"⚠️ {name} 无法导入，已移到 {INBOX_DIR}/quarantine：{error}")
+    df, filter_index, cube, rollups, version = store.snapshot
+    # 指纹带上实例ID：缓存过期重建后版本号从0重新计数，不会命中旧实例同版本号的筛选结果
+    return df, filter_index, cube, rollups, fingerprint + store.snapshot_key(version)
+
+def selection_key(selections):
+    """把筛选条件规范成可哈希的元组（与选择顺序无关），作为缓存key的一部分"""
+    return tuple((col, tuple(sorted(map(str, values)))) for col, values in sorted(selections.items()))
+
+def get_cube_selection(cube, fingerprint=None):
+    """按侧边栏当前选择切出立方体单元格；给出数据指纹时结果进共享缓存"""
+    selections = {col: st.session_state[key] for col, key in SIDEBAR_KEYS.items() if key in st.session_state}
+    if fingerprint is None:
+        return sales_cube.slice_cube(cube, selections)
+    return SALES_CACHE.get_or_compute(
+        ("sales_cube_slice", fingerprint, selection_key(selections)),
+        lambda: sales_cube.slice_cube(cube, selections)
+    )
+
+def get_streaming_cube(source):
+    """流式模式：逐块读取全部分区并折叠成立方体，按全部分区的指纹进共享缓存"""
+    fingerprint = tuple(file_fingerprint(path) for path in list_partitions(source))
+    
+    def build():
+        progress_text = st.empty()
+        cube = stream_sales_cube(
+            source,
+            progress=lambda chunks, rows: progress_text.info(f"正在分块汇总：{chunks} 块 / {rows:,} 行")
+        )
+        progress_text.empty()
+        return cube
+    
+    return SALES_CACHE.get_or_compute(("sales_stream_cube", fingerprint), build), fingerprint
+
+def add_stream_sidebar_func(cube, fingerprint=None):
+    """流式模式下的侧边栏：选项取自立方体维度，返回筛选后的立方体单元格"""
+    with st.sidebar:
+        st.header("🔍 数据筛选条件")
+        for col, key in SIDEBAR_KEYS.items():
+            values = cube[col].unique()
+            st.multiselect(f"选择{col}：", options=values, default=values, key=key)
+        
+        cube_slice = get_cube_selection(cube, fingerprint)
+        st.info(f"筛选后数据量：{int(cube_slice['rows'].sum())} 条")
+    return cube_slice
+
+def add_sidebar_func(df, filter_index=None, fingerprint=None):
+    """创建侧边栏筛选器，返回筛选后的数据（给出数据指纹时筛选结果进共享缓存）"""
+    if filter_index is None:
+        filter_index = SalesFilterIndex(df)
+    
     with st.sidebar:
         st.header("🔍 数据筛选条件")
         
         # 城市筛选
-        city_unique = df["城市"].unique()
+        city_unique = filter_index.values("城市")
         city = st.multiselect(
             "选择城市：",
             options=city_unique,
@@ -51,7 +125,7 @@ def add_sidebar_func(df):
         )
         
         # 顾客类型筛选
-        customer_type_unique = df["顾客类型"].unique()
+        customer_type_unique = filter_index.values("顾客类型")
         customer_type = st.multiselect(
             "选择顾客类型：",
             options=customer_type_unique,
@@ -60,7 +134,7 @@ def add_sidebar_func(df):
         )
         
         # 性别筛选
-        gender_unique = df["性别"].unique()
+        gender_unique = filter_index.values("性别")
         gender = st.multiselect(
             "选择性别：",
             options=gender_unique,
@@ -68,20 +142,30 @@ def add_sidebar_func(df):
             key="gender_select"
         )
         
-        # 应用筛选条件
-        df_selection = df.query(
-            "城市 == @city & 顾客类型 ==@customer_type & 性别 == @gender"
-        )
+        # 应用筛选条件（位图按位与，替代df.query表达式解析）
+        selections = {"城市": city, "顾客类型": customer_type, "性别": gender}
+        if fingerprint is None:
+            df_selection = filter_index.select(df, selections)
+        else:
+            df_selection = SALES_CACHE.get_or_compute(
+                ("sales_selection", fingerprint, selection_key(selections)),
+                lambda: filter_index.select(df, selections)
+            )
         
         # 显示筛选后的数据量
         st.info(f"筛选后数据量：{len(df_selection)} 条")
     
     return df_selection
 
-def product_line_chart(df):
+def product_line_chart(df, cube_slice=None):
     """生成按产品类型划分的销售额横向条形图"""
-    # 按产品类型分组计算总销售额并排序
-    sales_by_product_line = df.groupby(by=["产品类型"])["总价"].sum().sort_values()
+    # 按产品类型分组计算总销售额并排序（有立方体时直接汇总单元格）
+    if cube_slice is not None:
+        sales_by_product_line = sales_cube.sales_by_product_line(cube_slice)
+    else:
+        sales_by_product_line = df.groupby(by=["产品类型"], observed=True)["总价"].sum().sort_values()
+    # 限制柱子数量，类别再多也只下发有限的数据点
+    sales_by_product_line = cap_bars(sales_by_product_line)
     
     # 绘制横向条形图
     fig = px.bar(
@@ -103,10 +187,15 @@ def product_line_chart(df):
     )
     return fig
 
-def hour_chart(df):
+def hour_chart(df, cube_slice=None):
     """生成按小时数划分的销售额条形图"""
-    # 按小时数分组计算总销售额
-    sales_by_hour = df.groupby(by=["小时数"])["总价"].sum()
+    # 按小时数分组计算总销售额（有立方体时直接汇总单元格）
+    if cube_slice is not None:
+        sales_by_hour = sales_cube.sales_by_hour(cube_slice)
+    else:
+        sales_by_hour = df.groupby(by=["小时数"], observed=True)["总价"].sum()
+    # 数值横轴按固定宽度分桶，保证柱子数量有上限
+    sales_by_hour = bucket_series(sales_by_hour)
     
     # 绘制纵向条形图
     fig = px.bar(
@@ -127,17 +216,23 @@ def hour_chart(df):
     )
     return fig
 
-def main_page_demo(df):
+def main_page_demo(df, cube_slice=None):
     """渲染主页面（关键指标+图表）"""
     # 页面标题
     st.title(':bar_chart: 超市销售数据分析仪表板')
     st.markdown("---")  # 分割线
     
-    # 计算核心指标
-    total_sales = int(df["总价"].sum())  # 总销售额
-    average_rating = round(df["评分"].mean(), 1)  # 平均评分
+    # 计算核心指标（有立方体时由单元格汇总得出，无需扫描明细）
+    if cube_slice is not None:
+        kpis = sales_cube.cube_kpis(cube_slice)
+        total_sales = int(kpis["total_sales"])  # 总销售额
+        average_rating = round(kpis["average_rating"], 1)  # 平均评分
+        avg_per_trans = round(kpis["avg_per_trans"], 2)  # 单笔平均销售额
+    else:
+        total_sales = int(df["总价"].sum())  # 总销售额
+        average_rating = round(df["评分"].mean(), 1)  # 平均评分
+        avg_per_trans = round(df["总价"].mean(), 2)  # 单笔平均销售额
     star_rating = ":star:" * int(round(average_rating, 0))  # 星级展示
-    avg_per_trans = round(df["总价"].mean(), 2)  # 单笔平均销售额
     
     # 核心指标展示（三列布局）
     col1, col2, col3 = st.columns(3)
@@ -156,13 +251,95 @@ def main_page_demo(df):
     # 图表展示（两列布局）
     col_left, col_right = st.columns(2)
     with col_left:
-        st.plotly_chart(hour_chart(df), use_container_width=True)
+        st.plotly_chart(hour_chart(df, cube_slice), use_container_width=True)
     with col_right:
-        st.plotly_chart(product_line_chart(df), use_container_width=True)
+        st.plotly_chart(product_line_chart(df, cube_slice), use_container_width=True)
     
-    # 可选：展示原始数据（折叠面板）
+    # 可选：展示原始数据（折叠面板）；流式模式下没有明细，展示立方体汇总
     with st.expander("📋 查看筛选后原始数据"):
-        st.dataframe(df, use_container_width=True)
+        if df is not None:
+            show_paginated_dataframe(df)
+        else:
+            st.caption("流式模式不加载明细数据，以下为按维度汇总的结果")
+            st.dataframe(cube_slice, use_container_width=True)
+
+def trend_section(rollups):
+    """按日期的销售趋势与同比视图：全部由日/周/月汇总表回答，不扫描明细"""
+    st.markdown("---")
+    st.subheader("📈 销售趋势")
+    
+    first_day, last_day = sales_rollup.date_bounds(rollups)
+    col_range, col_grain = st.columns([2, 1])
+    with col_range:
+        date_range = st.date_input(
+            "日期区间",
+            value=(first_day.date(), last_day.date()),
+            min_value=first_day.date(),
+            max_value=last_day.date(),
+            key="trend_date_range"
+        )
+    with col_grain:
+        grain = st.radio("统计粒度", list(sales_rollup.GRAINS), index=0, horizontal=True, key="trend_grain")
+    
+    # 日期区间选到一半时只有起点，等选完再查询
+    if not isinstance(date_range, (tuple, list)) or len(date_range) != 2:
+        st.info("请选择完整的日期区间")
+        return
+    
+    # 汇总表只按城市、产品类型拆分，侧边栏的城市筛选在这里同样生效
+    selections = {"城市": st.session_state["city_select"]} if "city_select" in st.session_state else None
+    trend = sales_rollup.query_trend(rollups, grain, date_range[0], date_range[1], selections).reset_index()
+    trend = downsample_frame(trend, "期间", "销售额")
+    fig = px.line(
+        trend,
+        x="期间",
+        y="销售额",
+        markers=True,
+        title=f"<b>按{grain}划分的销售额</b>",
+        template="plotly_white"
+    )
+    fig.update_layout(xaxis_title="日期", yaxis_title="销售额（RMB）", height=400)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # 同比：月汇总按年份分组
+    yoy = sales_rollup.year_over_year(rollups, selections)
+    if yoy.shape[1] > 1:
+        yoy_long = yoy.reset_index().melt(id_vars="月份", var_name="年份", value_name="销售额")
+        fig_yoy = px.line(
+            yoy_long,
+            x="月份",
+            y="销售额",
+            color="年份",
+            markers=True,
+            title="<b>月度销售额同比</b>",
+            template="plotly_white"
+        )
+        fig_yoy.update_layout(xaxis_title="月份", yaxis_title="销售额（RMB）", height=400)
+        st.plotly_chart(fig_yoy, use_container_width=True)
+    else:
+        st.caption("数据只覆盖一个年份，暂无同比视图")
+
+def show_paginated_dataframe(df, key="raw_page"):
+    """服务端分页展示明细：每次只把当前页发给浏览器"""
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = st.selectbox("每页行数", [50, DEFAULT_PAGE_SIZE, 500, 1000], index=1, key=f"{key}_size")
+    with col_page:
+        n_pages = page_count(len(df), page_size)
+        # 页码只通过Session State控制（控件不再传value，避免“默认值与Session State同时设置”的警告）
+        if st.session_state.get(key, 1) > n_pages:  # 筛选后页数变少时回到第一页
+            st.session_state[key] = 1
+        page = st.number_input(f"页码（共 {n_pages} 页）", min_value=1, max_value=n_pages, step=1, key=key)
+    st.dataframe(paginate(df, page, page_size), use_container_width=True)
+    st.caption(f"共 {len(df):,} 条，当前第 {page}/{n_pages} 页")
+
+def show_cache_stats():
+    """侧边栏底部显示共享缓存的命中情况"""
+    stats = SALES_CACHE.stats()
+    st.sidebar.caption(
+        f"共享缓存：命中率 {stats['hit_rate']:.0%}（{stats['hits']}/{stats['hits'] + stats['misses']}），"
+        f"{stats['entries']} 项 / {stats['bytes'] / 1024 / 1024:.1f} MB"
+    )
 
 def run_app():
     """应用入口函数"""
@@ -174,10 +351,21 @@ def run_app():
         initial_sidebar_state="expanded"
     )
     
+    # 流式模式：分区文件 → 立方体 → 渲染页面（不生成完整DataFrame）
+    partition_source = os.environ.get(PARTITION_DIR_ENV)
+    if partition_source:
+        cube, fingerprint = get_streaming_cube(partition_source)
+        cube_slice = add_stream_sidebar_func(cube, fingerprint)
+        main_page_demo(None, cube_slice)
+        show_cache_stats()
+        return
+    
     # 读取数据 → 筛选数据 → 渲染页面
-    df_raw = get_dataframe_from_excel()
-    df_filtered = add_sidebar_func(df_raw)
-    main_page_demo(df_filtered)
+    df_raw, filter_index, cube, rollups, fingerprint = get_sales_data()
+    df_filtered = add_sidebar_func(df_raw, filter_index, fingerprint)
+    main_page_demo(df_filtered, get_cube_selection(cube, fingerprint))
+    trend_section(rollups)
+    show_cache_stats()
 
 if __name__ == "__main__":
     run_app()